@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
+
+import orjson
+from fastapi import Request, Response
+
+# what a backend raises when it cannot be reached (the shared state server
+# restarting), the request is then answered without the cache
+BACKEND_ERRORS = (OSError, RuntimeError)
+
+
+class CacheBackend:
+    """Interface for cache storage, swap MemoryCache for a shared one if needed"""
+
+    async def get(self, key):
+        raise NotImplementedError
+
+    async def set(self, key, value, tags, generations=None):
+        """Store the entry, unless generations is given and a tag was invalidated since"""
+        raise NotImplementedError
+
+    async def invalidate(self, *tags):
+        raise NotImplementedError
+
+    async def generations(self, tags):
+        """Per tag counter, every invalidate of the tag increments it"""
+        raise NotImplementedError
+
+    async def size(self):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process cache with a TTL per entry and LRU eviction above max_entries"""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self.tag_generations = {}
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key, value, tags, generations=None):
+        if generations is not None and generations != await self.generations(tags):
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value, set(tags))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def invalidate(self, *tags):
+        for tag in tags:
+            self.tag_generations[tag] = self.tag_generations.get(tag, 0) + 1
+        for key in [k for k, entry in self.entries.items() if entry[2] & set(tags)]:
+            del self.entries[key]
+
+    async def generations(self, tags):
+        return [self.tag_generations.get(tag, 0) for tag in tags]
+
+    async def size(self):
+        return len(self.entries)
+
+
+class ResponseCache:
+    """
+    Caches encoded JSON responses per path + query string. Entries are tagged
+    with the collections they were built from, writes invalidate by tag.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def invalidate(self, *tags):
+        await self.backend.invalidate(*tags)
+
+    async def stats(self):
+        try:
+            entries = await self.backend.size()
+        except BACKEND_ERRORS:
+            entries = None
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors, "entries": entries}
+
+    def cached(self, *tags):
+        """Route decorator, the handler keeps its own parameters"""
+
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def wrapper(request: Request, **kwargs):
+                key = request.url.path + "?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+                try:
+                    entry = await self.backend.get(key)
+                    # a write that invalidates while the handler runs may be
+                    # missing from its result, such an entry is not stored
+                    generations = None if entry else await self.backend.generations(tags)
+                except BACKEND_ERRORS:
+                    self.errors += 1
+                    entry = generations = None
+                if entry is None:
+                    self.misses += 1
+                    body = orjson.dumps(await handler(**kwargs), default=str, option=orjson.OPT_NON_STR_KEYS)
+                    entry = {"body": body, "etag": '"' + hashlib.md5(body).hexdigest() + '"'}
+                    if generations is not None:
+                        try:
+                            await self.backend.set(key, entry, tags, generations)
+                        except BACKEND_ERRORS:
+                            self.errors += 1
+                else:
+                    self.hits += 1
+
+                headers = {"ETag": entry["etag"]}
+                if request.headers.get("if-none-match") == entry["etag"]:
+                    return Response(status_code=304, headers=headers)
+                return Response(entry["body"], media_type="application/json", headers=headers)
+
+            # expose request + the handler's own parameters to FastAPI
+            params = [inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)]
+            params += [p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in inspect.signature(handler).parameters.values()]
+            wrapper.__signature__ = inspect.Signature(params)
+            return wrapper
+
+        return decorator
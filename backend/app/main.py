@@ -1,22 +1,219 @@
+import asyncio
+import base64
+import csv
+import io
+import math
 import os
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 
+import orjson
 from bson import ObjectId
-from fastapi import FastAPI
-from pymongo import MongoClient
+from bson.errors import InvalidId
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pymongo import ASCENDING, DESCENDING, TEXT, AsyncMongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from fastapi.middleware.cors import CORSMiddleware
-from collections import defaultdict
 from fastapi import Query
 
+from app.cache import BACKEND_ERRORS, MemoryCache, ResponseCache
+from app.metrics import Metrics, MongoCommandListener, timing_middleware
+from app.models import ItemPage, LocationList, User, UserPage
+from app.shared_state import SharedState
+from app.stock_feed import StockFeed
+from app.workers import acquire_leadership, mongo_pool_size
+
 # --- Database connections ---
 # MongoDB connection
+# Async driver, handlers await Mongo on the event loop instead of blocking
+# one threadpool worker each. Pool sizes can be tuned per deployment, with
+# several workers they come from a total budget (see app/workers.py).
+# The client is only created on first use, importing the app never touches Mongo.
 mongo_url = os.getenv("MONGO_URL")
-client = MongoClient(mongo_url)
-db = client["aoz_db"]
-users_collection = db["users"]
-
+mongo_db_name = os.getenv("MONGO_DB", "aoz_db")  # the benchmarks use their own database
+metrics = Metrics()
+client = None
+client_pid = None
+
+def get_client():
+    global client, client_pid
+    # a client must not cross a fork, a process forked after it was created makes its own
+    if client is None or client_pid != os.getpid():
+        pool_size = mongo_pool_size()
+        client = AsyncMongoClient(
+            mongo_url,
+            event_listeners=[MongoCommandListener(metrics)],
+            maxPoolSize=pool_size,
+            minPoolSize=min(int(os.getenv("MONGO_MIN_POOL_SIZE", "0")), pool_size),
+        )
+        client_pid = os.getpid()
+    return client
+
+async def close_client():
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+class LazyDatabase:
+    """Stands in for client[mongo_db_name], creates the client on first access"""
+
+    def __getattr__(self, name):
+        return getattr(get_client()[mongo_db_name], name)
+
+    def __getitem__(self, name):
+        return get_client()[mongo_db_name][name]
+
+db = LazyDatabase()
+
+# Item storage mode:
+#   "units" (default) one document per physical unit in db.items, db.skus is
+#           kept alongside as the per-SKU counter table
+#   "sku"   only db.skus (one document per location/category/name with
+#           available/reserved quantities), see app/migrate_skus.py
+ITEM_STORAGE = os.getenv("ITEM_STORAGE", "units")
+
+
+# --- Workers ---
+# Under gunicorn (gunicorn.conf.py) several worker processes serve the app.
+# They share the response cache, change counters and their metrics through
+# the shared state server on SHARED_STATE_SOCKET. One of them, the leader,
+# prepares the database and runs the periodic jobs. Without the socket this
+# is a single process that does everything itself.
+
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET")
+SHARED_STATE_SECONDS = float(os.getenv("SHARED_STATE_SECONDS", "2"))
+shared_state = SharedState(SHARED_STATE_SOCKET) if SHARED_STATE_SOCKET else None
+is_leader = shared_state is None
+
+# in-process data other workers can change: name -> reload function
+shared_reloads = {
+    "categories": lambda: load_category_catalog(),
+    "locations": lambda: load_location_index(),
+}
+seen_changes = {}  # name -> last change counter this worker has loaded
+
+async def announce_change(name):
+    """Make the other workers reload name (see shared_reloads)"""
+    if shared_state is not None:
+        seen_changes[name] = await shared_state.incr(name)
+
+async def follow_shared_state():
+    """Publish this worker's numbers and reload what another worker changed"""
+    while True:
+        await asyncio.sleep(SHARED_STATE_SECONDS)
+        try:
+            await shared_state.publish(os.getpid(), {
+                "metrics": metrics,
+                "cache": {"hits": response_cache.hits, "misses": response_cache.misses, "errors": response_cache.errors},
+                "imports": list(import_progress.values()),
+            })
+            if not boot_state["ready"]:
+                continue
+            for name, reload in shared_reloads.items():
+                changes = await shared_state.counter(name)
+                if changes != seen_changes.get(name, 0):
+                    seen_changes[name] = changes
+                    await reload()
+        except Exception as e:
+            print("Shared state sync failed:", e)
+
+async def other_workers():
+    """Last published state of the other workers, empty with a single process"""
+    if shared_state is None:
+        return []
+    try:
+        states = await shared_state.worker_states()
+    except BACKEND_ERRORS as e:
+        print("Shared state not reachable, answering for this worker only:", e)
+        return []
+    return [state for pid, state in states.items() if pid != os.getpid()]
+
+# --- Startup ---
+# The app serves / and /health/live right away, everything that needs Mongo
+# runs in bootstrap() in the background (retrying until Mongo answers) and
+# /health/ready reports when it is done.
+
+SEED_ON_STARTUP = os.getenv("SEED_ON_STARTUP", "0") == "1"
+
+boot_state = {"ready": False, "error": None, "seconds": None}
+boot_started = time.perf_counter()
+
+async def prepare_database():
+    """Collections, indexes, fixtures and counters, done by the leader only"""
+    await ensure_stock_history()
+    await ensure_indexes()
+    if SEED_ON_STARTUP:
+        await seed_fixtures()
+    if (ITEM_STORAGE == "units" and await db.skus.estimated_document_count() == 0
+            and await db.items.estimated_document_count() > 0):
+        await rebuild_item_counts()
+        print("Rebuilt SKU counters from items.")
+
+async def bootstrap():
+    while True:
+        try:
+            if is_leader:
+                await prepare_database()
+                if shared_state is not None:
+                    await shared_state.incr("prepared")
+            else:
+                while not await shared_state.counter("prepared"):
+                    await asyncio.sleep(0.5)
+            if shared_state is not None:
+                for name in shared_reloads:
+                    seen_changes[name] = await shared_state.counter(name)
+            await load_category_catalog()
+            await load_location_index()
+            break
+        except (PyMongoError, OSError) as e:
+            boot_state["error"] = str(e)
+            print("Bootstrap failed, retrying in 5s:", e)
+            await asyncio.sleep(5)
+        except Exception as e:
+            boot_state["error"] = str(e)
+            print("Bootstrap failed:", e)
+            raise
+    boot_state.update(ready=True, error=None, seconds=round(time.perf_counter() - boot_started, 3))
+    print(f"Bootstrap finished after {boot_state['seconds']}s.")
+
+@asynccontextmanager
+async def lifespan(app):
+    global is_leader
+    if shared_state is not None:
+        is_leader = acquire_leadership(SHARED_STATE_SOCKET + ".leader")
+        print(f"Worker {os.getpid()} started" + (" as leader." if is_leader else "."))
+    background_tasks.append(asyncio.create_task(bootstrap()))
+    if is_leader:
+        background_tasks.append(asyncio.create_task(reservation_sweeper()))
+        background_tasks.append(asyncio.create_task(stock_snapshotter()))
+    if shared_state is not None:
+        background_tasks.append(asyncio.create_task(follow_shared_state()))
+    yield
+    await stop_background_tasks()
+    await close_client()
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    await stock_feed.stop()
+
+class FastJSONResponse(JSONResponse):
+    """Default response class, encodes with orjson instead of the stdlib json"""
+
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
 
 # Create FastAPI app
-app = FastAPI(title="AOZ Supply Coordination Backend")
+app = FastAPI(
+    title="AOZ Supply Coordination Backend",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,57 +222,59 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+@app.middleware("http")
+async def record_request_timing(request, call_next):
+    return await timing_middleware(metrics, request, call_next)
+
+# Summary endpoints are cached until a write touches their collection,
+# in the shared state server when several workers run
+response_cache = ResponseCache(shared_state or MemoryCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+    ttl=int(os.getenv("CACHE_TTL_SECONDS", "300")),
+))
+
+# asyncio tasks started at startup (bootstrap, jobs, shared state sync), cancelled on shutdown
+background_tasks = []
+
+# one upstream watcher on db.skus shared by all /stream/stock clients
+stock_feed = StockFeed(lambda: db.skus, poll_seconds=float(os.getenv("STOCK_POLL_SECONDS", "2")))
+
 # --- Routes ---
 
-@app.on_event("startup")
-def startup_populate_db():
-    if users_collection.count_documents({}) == 0:
-        users_collection.insert_many(sample_users)
-        print("Populated mock user data.")
-    if db.items.count_documents({}) == 0:
-        db.items.insert_many(sample_items)
-        print("Populate mock item data.")
-    if db.locations.count_documents({}) == 0:
-        db.locations.insert_many(sample_locations)
-        print("Populate location data.")
-    print("Database population at startup finished.")
+def location_stock_pipeline(location):
+    """Stock of one location, one row per (category, name)"""
+    return [
+        {"$match": {"location": location}},
+        {
+            "$group": {
+                "_id": {"category": "$category", "name": "$name"},
+                "available": {"$sum": "$available"},
+                "reserved": {"$sum": "$reserved"},
+            }
+        },
+        {"$sort": {"_id.category": 1, "_id.name": 1}},
+    ]
 
 @app.get("/items/by_location")
-def get_items_by_location(location: str = Query(..., description="e.g. loc_centrum")):
+@response_cache.cached("items")
+async def get_items_by_location(location: str = Query(..., description="e.g. loc_centrum")):
     """
     Return stock for a single location, grouped by category and item name.
     Example: bedding -> Bett / Kissen / Decke / Schlafsack with counts.
     """
-    cursor = db.items.find({"location": location}, {"_id": 0})
-
-    # structure:
-    # categories["bedding"] = { "Bett": {"available": 0, "reserved": 0} , ... }
-    categories = defaultdict(lambda: defaultdict(lambda: {"available": 0, "reserved": 0}))
-
-    for doc in cursor:
-        cat = doc.get("category", "unknown")
-        item_name = doc.get("name", "unknown")
-        status = doc.get("status", "available")
-        if status not in ["available", "reserved"]:
-            status = "available"
-        categories[cat][item_name][status] += 1
-
-    # convert that defaultdict mess into clean arrays for frontend
+    # grouping happens in Mongo, only one row per (category, name) comes back
     result_categories = {}
-    for cat, items in categories.items():
-        result_categories[cat] = []
-        for item_name, counts in items.items():
-            available = counts["available"]
-            reserved = counts["reserved"]
-            total = available + reserved
-            result_categories[cat].append(
-                {
-                    "name": item_name,
-                    "available": available,
-                    "reserved": reserved,
-                    "total": total,
-                }
-            )
+    async for row in await db.skus.aggregate(location_stock_pipeline(location)):
+        cat = row["_id"].get("category", "unknown")
+        result_categories.setdefault(cat, []).append(
+            {
+                "name": row["_id"].get("name", "unknown"),
+                "available": row["available"],
+                "reserved": row["reserved"],
+                "total": row["available"] + row["reserved"],
+            }
+        )
 
     return {
         "location": location,
@@ -83,37 +282,586 @@ def get_items_by_location(location: str = Query(..., description="e.g. loc_centr
     }
 
 @app.get("/")
-def root():
+async def root():
     """Health check route"""
     return {"status": "ok", "message": "Backend running successfully"}
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up, does not touch Mongo"""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Bootstrap is done and Mongo answers a ping"""
+    if not boot_state["ready"]:
+        return FastJSONResponse({"status": "starting", "error": boot_state["error"]}, status_code=503)
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=2)
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        return FastJSONResponse({"status": "unavailable", "error": str(e)}, status_code=503)
+    return {"status": "ready", "boot_seconds": boot_state["seconds"]}
+
 @app.get("/mongo/test")
-def test_mongo():
+async def test_mongo():
     """Check if MongoDB connection works"""
     try:
-        db.list_collection_names()
+        await db.list_collection_names()
         return {"mongo": "connected"}
     except Exception as e:
         return {"mongo": "connection failed", "error": str(e)}
 
-@app.get("/items")
-def get_items():
-    """Example route: list all items from a collection"""
-    print("get items called")
-    items = list(db.items.find({}, {"_id": 0}))  # return all without MongoDB _id field
-    print(items)
-    return {"items": items}
+def item_filter(location=None, category=None, name=None, status=None):
+    """Build a Mongo filter from the optional item query parameters"""
+    query = {"location": location, "category": category, "name": name}
+    query = {k: v for k, v in query.items() if v is not None}
+    if status is not None:
+        if ITEM_STORAGE == "units":
+            query["status"] = status
+        else:
+            # SKU documents have quantities instead of a status
+            query[status_field(status)] = {"$gt": 0}
+    return query
+
+def items_collection():
+    """Unit documents, or the SKU documents in sku mode"""
+    return db.items if ITEM_STORAGE == "units" else db.skus
+
+def item_projection(fields):
+    """'name,location' -> {"name": 1, "location": 1}, None keeps all fields"""
+    if not fields:
+        return None
+    return {f.strip(): 1 for f in fields.split(",") if f.strip()}
+
+def as_text(value):
+    """Stored value as the string the response models expect, None stays None"""
+    return value if value is None or isinstance(value, str) else str(value)
+
+def item_to_dict(doc):
+    doc["id"] = str(doc.pop("_id"))
+    # POST /items stores whatever it gets, one odd unit must not fail the page
+    for field in ("name", "category", "status", "location"):
+        if field in doc:
+            doc[field] = as_text(doc[field])
+    if "reservation_id" in doc:  # set on units held by a reservation
+        doc["reservation_id"] = str(doc["reservation_id"])
+    return doc
+
+@app.get("/items", response_model=ItemPage, response_model_exclude_unset=True)
+async def get_items(
+    after: str | None = Query(None, description="id of the last item of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    fields: str | None = Query(None, description="e.g. name,location"),
+    location: str | None = None,
+    category: str | None = None,
+    name: str | None = None,
+    status: str | None = None,
+):
+    """List items one page at a time (keyset pagination on _id)"""
+    query = item_filter(location, category, name, status)
+    if after:
+        try:
+            query["_id"] = {"$gt": ObjectId(after)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    cursor = items_collection().find(query, item_projection(fields)).sort("_id", ASCENDING).limit(limit)
+    items = [item_to_dict(doc) async for doc in cursor]
+    # a full page means there may be more, the client passes next as ?after=
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return {"items": items, "next": next_cursor}
+
+@app.get("/items/stream")
+async def stream_items(
+    fields: str | None = Query(None, description="e.g. name,location"),
+    location: str | None = None,
+    category: str | None = None,
+    name: str | None = None,
+    status: str | None = None,
+):
+    """Export matching items as NDJSON, one document per line straight from the cursor"""
+    cursor = items_collection().find(item_filter(location, category, name, status), item_projection(fields))
+
+    async def lines():
+        async for doc in cursor:
+            yield orjson.dumps(item_to_dict(doc), default=str) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @app.post("/items")
-def add_item(item: dict):
+async def add_item(item: dict):
     """Example route: add a new item to Mongo"""
-    db.items.insert_one(item)
+    if ITEM_STORAGE == "units":
+        await db.items.insert_one(item)
+        item.pop("_id", None)  # insert_one adds an ObjectId which is not JSON serializable
+    await bump_item_count(item, 1)
     return {"status": "inserted", "item": item}
 
-@app.get("/locations")
-def get_locations():
+ITEM_STATUSES = ("available", "reserved")
+
+@app.put("/items/{item_id}/status")
+async def update_item_status(item_id: str, status: str = Query(..., description="e.g. reserved")):
+    """Change the status of a single unit and keep the counters in sync"""
+    if ITEM_STORAGE != "units":
+        return {"error": "Single units are not stored in sku mode, use PATCH /items/status"}
+    if status not in ITEM_STATUSES:
+        return {"error": "status must be available or reserved"}
+    try:
+        query = {"_id": ObjectId(item_id)}
+    except InvalidId:
+        return {"error": "Item not found"}
+    # held units change only through their reservation, see release_reservation
+    old_item = await db.items.find_one_and_update(
+        {**query, "reservation_id": {"$exists": False}}, {"$set": {"status": status}}
+    )
+    if not old_item:
+        if await db.items.count_documents(query, limit=1):
+            return {"error": "Item is held by a reservation, release it through DELETE /reservations/{id}"}
+        return {"error": "Item not found"}
+    if status_field(old_item.get("status")) != status_field(status):
+        await bump_item_count(old_item, -1)
+        await bump_item_count({**old_item, "status": status}, 1)
+    return {"status": "updated", "id": item_id, "new_status": status}
+
+BULK_BATCH_SIZE = 1000
+BULK_MAX_QUANTITY = int(os.getenv("BULK_MAX_QUANTITY", "100000"))
+
+def validate_bulk_row(row):
+    """Check a bulk row and return its quantity (1 for a single unit)"""
+    for field in ("name", "category", "location"):
+        if not row.get(field):
+            raise ValueError(f"missing field '{field}'")
+    quantity = row.get("quantity", 1)
+    if not isinstance(quantity, int) or quantity < 1:
+        raise ValueError("quantity must be a positive integer")
+    if quantity > BULK_MAX_QUANTITY:
+        raise ValueError(f"quantity must not exceed {BULK_MAX_QUANTITY}")
+    return quantity
+
+def bulk_row_units(row, quantity):
+    """Expand a bulk row into unit documents, {..., "quantity": 300} -> 300 units, one at a time"""
+    unit = {k: v for k, v in row.items() if k != "quantity"}
+    unit.setdefault("status", "available")
+    for _ in range(quantity):
+        yield dict(unit)
+
+@app.post("/items/bulk")
+async def add_items_bulk(rows: list[dict]):
+    """
+    Insert many units at once. Each row is either a single unit or a
+    {name, category, location, status, quantity} row for a whole delivery.
+    """
+    results = [{"row": i, "inserted": 0} for i in range(len(rows))]
+    deltas = {}
+    batch, batch_rows = [], []
+
+    async def flush():
+        failed = set()
+        try:
+            await db.items.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                failed.add(error["index"])
+                results[batch_rows[error["index"]]]["error"] = error["errmsg"]
+        for i, (doc, row) in enumerate(zip(batch, batch_rows)):
+            if i not in failed:
+                results[row]["inserted"] += 1
+                count_deltas([doc], deltas)
+        batch.clear()
+        batch_rows.clear()
+
+    for i, row in enumerate(rows):
+        try:
+            quantity = validate_bulk_row(row)
+        except ValueError as e:
+            results[i]["error"] = str(e)
+            continue
+        if ITEM_STORAGE != "units":
+            # sku mode: the whole row is a single $inc
+            key = (*sku_key(row).values(), status_field(row.get("status")))
+            deltas[key] = deltas.get(key, 0) + quantity
+            results[i]["inserted"] = quantity
+            continue
+        for unit in bulk_row_units(row, quantity):
+            batch.append(unit)
+            batch_rows.append(i)
+            if len(batch) == BULK_BATCH_SIZE:
+                await flush()
+    if batch:
+        await flush()
+
+    await bump_item_counts(deltas)
+    return {
+        "status": "inserted",
+        "inserted": sum(r["inserted"] for r in results),
+        "rows": results,
+    }
+
+# --- Import / export ---
+# Intake lists arrive as CSV (one row per line, "," or ";" separated, first
+# line is the header) or NDJSON. The upload is read chunk by chunk and written
+# in BULK_BATCH_SIZE batches, so memory does not grow with the file size.
+
+IMPORT_MAX_ERRORS = 100
+EXPORT_CHUNK_ROWS = 1000
+
+# import id -> progress of the imports this process runs, readable through
+# GET /items/import. Other workers' imports come from their last publish to
+# the shared state server, so they lag up to SHARED_STATE_SECONDS behind.
+import_progress = {}
+
+async def request_lines(request):
+    """Lines of the request body, without holding more than one chunk"""
+    rest = b""
+    async for chunk in request.stream():
+        rest += chunk
+        *lines, rest = rest.split(b"\n")
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+async def import_rows(request, fmt, progress):
+    """Yield (line number, row dict or error text) from a CSV or NDJSON body"""
+    header, delimiter = None, ","
+    line_no = 0
+    async for raw in request_lines(request):
+        line_no += 1
+        progress["bytes"] += len(raw) + 1
+        line = raw.decode("utf-8-sig" if line_no == 1 else "utf-8", errors="replace").strip("\r")
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                yield line_no, "invalid JSON"
+                continue
+            yield line_no, row if isinstance(row, dict) else "expected a JSON object"
+            continue
+        if header is None:
+            # Excel with Swiss/German settings writes ";" separated files
+            delimiter = ";" if line.count(";") > line.count(",") else ","
+            header = [h.strip() for h in next(csv.reader([line], delimiter=delimiter))]
+            continue
+        values = next(csv.reader([line], delimiter=delimiter))
+        row = {k: v.strip() for k, v in zip(header, values) if k and v.strip()}
+        if "quantity" in row:
+            try:
+                row["quantity"] = int(row["quantity"])
+            except ValueError:
+                yield line_no, "quantity must be a positive integer"
+                continue
+        yield line_no, row
+
+@app.post("/items/import")
+async def import_items(request: Request, format: str | None = Query(None, description="csv or ndjson")):
+    """
+    Import a CSV or NDJSON upload, one {name, category, location, status?, quantity?}
+    row per line, e.g. curl --data-binary @lieferung.csv -H "Content-Type: text/csv"
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson" if "json" in content_type else None)
+    if fmt not in ("csv", "ndjson"):
+        return {"error": "Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"}
+
+    import_id = str(ObjectId())
+    progress = import_progress[import_id] = {
+        "id": import_id, "format": fmt, "started_at": datetime.now(timezone.utc), "done": False,
+        "bytes": 0, "rows": 0, "inserted": 0, "failed": 0, "errors": [],
+    }
+    deltas, batch = {}, []
+
+    def fail(line_no, message):
+        progress["failed"] += 1
+        if len(progress["errors"]) < IMPORT_MAX_ERRORS:
+            progress["errors"].append({"line": line_no, "error": message})
+
+    async def flush():
+        if ITEM_STORAGE == "units" and batch:
+            try:
+                await db.items.insert_many(batch, ordered=False)
+                inserted = batch
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details["writeErrors"]}
+                for error in e.details["writeErrors"][:IMPORT_MAX_ERRORS]:
+                    fail(None, error["errmsg"])
+                inserted = [doc for i, doc in enumerate(batch) if i not in failed]
+            progress["inserted"] += len(inserted)
+            count_deltas(inserted, deltas)
+            batch.clear()
+        # counters follow every batch, a broken upload leaves them in sync
+        await bump_item_counts(deltas)
+        deltas.clear()
+
+    try:
+        async for line_no, row in import_rows(request, fmt, progress):
+            progress["rows"] += 1
+            if isinstance(row, str):
+                fail(line_no, row)
+                continue
+            row = {k: v for k, v in row.items() if k not in ("id", "_id")}
+            try:
+                quantity = validate_bulk_row(row)
+            except ValueError as e:
+                fail(line_no, str(e))
+                continue
+            if ITEM_STORAGE != "units":
+                key = (*sku_key(row).values(), status_field(row.get("status")))
+                deltas[key] = deltas.get(key, 0) + quantity
+                progress["inserted"] += quantity
+                if len(deltas) >= BULK_BATCH_SIZE:
+                    await flush()
+                continue
+            for unit in bulk_row_units(row, quantity):
+                batch.append(unit)
+                if len(batch) == BULK_BATCH_SIZE:
+                    await flush()
+        await flush()
+    finally:
+        progress["done"] = True
+        # keep the last finished imports around for GET /items/import
+        finished = [k for k, p in import_progress.items() if p["done"]]
+        for key in finished[:-10]:
+            del import_progress[key]
+
+    return {"status": "imported", **progress}
+
+@app.get("/items/import")
+async def get_import_progress():
+    """Running and recently finished imports of all workers"""
+    imports = list(import_progress.values())
+    for state in await other_workers():
+        imports += state["imports"]
+    imports.sort(key=lambda p: p["started_at"])
+    return {"imports": imports}
+
+@app.get("/items/export")
+async def export_items(
+    location: str | None = None,
+    category: str | None = None,
+    name: str | None = None,
+    status: str | None = None,
+):
+    """
+    Matching items as CSV, straight from the cursor. The columns can be fed
+    back into POST /items/import in either storage mode.
+    """
+    query = item_filter(location, category, name, status)
+    if ITEM_STORAGE == "units":
+        columns = ["id", "name", "category", "location", "status"]
+        cursor = db.items.find(query, {f: 1 for f in columns[1:]})
+
+        def csv_rows(doc):
+            yield [str(doc["_id"]), *(doc.get(f, "") for f in columns[1:])]
+    else:
+        columns = ["name", "category", "location", "status", "quantity"]
+        cursor = db.skus.find(query, {"_id": 0})
+        fields = [status_field(status)] if status else ["available", "reserved"]
+
+        def csv_rows(doc):
+            # one row per status with stock, so the file imports as it was
+            for field in fields:
+                if doc.get(field):
+                    yield [doc.get("name"), doc.get("category"), doc.get("location"), field, doc[field]]
+
+    async def chunks():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        rows = 0
+        async for doc in cursor.batch_size(EXPORT_CHUNK_ROWS):
+            for row in csv_rows(doc):
+                writer.writerow(row)
+                rows += 1
+            if rows >= EXPORT_CHUNK_ROWS:
+                yield out.getvalue().encode()
+                out.seek(0)
+                out.truncate()
+                rows = 0
+        yield out.getvalue().encode()
+
+    return StreamingResponse(
+        chunks(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="items.csv"'},
+    )
+
+@app.patch("/items/status")
+async def update_items_status(rows: list[dict]):
+    """
+    Reserve/release N units of a SKU at a location per row, e.g.
+    {"name": "Decke", "category": "bedding", "location": "loc_west", "status": "reserved", "quantity": 40}
+    """
+    results = []
+    for i, row in enumerate(rows):
+        status = row.get("status")
+        quantity = row.get("quantity", 1)
+        if not all(row.get(f) for f in ("name", "category", "location", "status")):
+            results.append({"row": i, "error": "name, category, location and status are required"})
+            continue
+        if not isinstance(quantity, int) or quantity < 1:
+            results.append({"row": i, "error": "quantity must be a positive integer"})
+            continue
+        from_status = row.get("from_status", "available" if status == "reserved" else "reserved")
+        if status not in ITEM_STATUSES or from_status not in ITEM_STATUSES:
+            results.append({"row": i, "error": "status and from_status must be available or reserved"})
+            continue
+
+        sku = sku_key(row)
+        if ITEM_STORAGE != "units":
+            changed = await move_sku_quantity(sku, status_field(from_status), status_field(status), quantity)
+            results.append({"row": i, "requested": quantity, "updated": changed})
+            continue
+
+        # units held by a reservation are left to it, see release_reservation
+        unheld = {"status": from_status, "reservation_id": {"$exists": False}}
+        ids = [doc["_id"] async for doc in db.items.find({**sku, **unheld}, {"_id": 1}).limit(quantity)]
+        # the status condition makes units changed concurrently by someone else drop out
+        result = await db.items.update_many({"_id": {"$in": ids}, **unheld}, {"$set": {"status": status}})
+        changed = result.modified_count
+        if changed and status_field(from_status) != status_field(status):
+            await bump_item_counts({
+                (*sku.values(), status_field(from_status)): -changed,
+                (*sku.values(), status_field(status)): changed,
+            })
+        results.append({"row": i, "requested": quantity, "updated": changed})
+
+    return {"status": "updated", "rows": results}
+
+# --- Stock per SKU ---
+# db.skus holds one document per (location, category, name) with available and
+# reserved quantities, updated with $inc. In "units" mode it is the counter
+# table next to the unit documents in db.items, in "sku" mode it is the stock
+# itself. Reads only use db.skus, so they scale with the catalogue size.
+
+def sku_key(item):
+    return {
+        "location": item.get("location", "unknown"),
+        "category": item.get("category", "unknown"),
+        "name": item.get("name", "unknown"),
+    }
+
+def status_field(status):
+    # anything that is not reserved counts as available
+    return "reserved" if status == "reserved" else "available"
+
+def count_deltas(units, deltas=None):
+    """Sum unit documents into {(location, category, name, field): delta}"""
+    deltas = {} if deltas is None else deltas
+    for unit in units:
+        key = (*sku_key(unit).values(), status_field(unit.get("status")))
+        deltas[key] = deltas.get(key, 0) + 1
+    return deltas
+
+def sku_increment(field, delta):
+    """$inc one quantity field, an upsert starts the other one at 0"""
+    other = "reserved" if field == "available" else "available"
+    return {"$inc": {field: delta}, "$setOnInsert": {other: 0}}
+
+async def bump_item_count(item, delta):
+    await db.skus.update_one(sku_key(item), sku_increment(status_field(item.get("status")), delta), upsert=True)
+    await response_cache.invalidate("items")
+
+async def bump_item_counts(deltas):
+    """Apply {(location, category, name, field): delta} in one bulk_write"""
+    ops = [
+        UpdateOne(dict(zip(("location", "category", "name"), key[:3])), sku_increment(key[3], delta), upsert=True)
+        for key, delta in deltas.items() if delta
+    ]
+    if ops:
+        await db.skus.bulk_write(ops, ordered=False)
+        await response_cache.invalidate("items")
+
+async def move_sku_quantity(sku, from_field, to_field, quantity):
+    """Move quantity between available/reserved only if enough is there, returns moved amount"""
+    if from_field == to_field:
+        return 0
+    result = await db.skus.update_one(
+        {**sku, from_field: {"$gte": quantity}},
+        {"$inc": {from_field: -quantity, to_field: quantity}},
+    )
+    if not result.modified_count:
+        return 0
+    await response_cache.invalidate("items")
+    return quantity
+
+async def rebuild_item_counts():
+    """Recompute db.skus from the unit documents in db.items, returns (rows, mismatched rows)"""
+    is_reserved = {"$eq": ["$status", "reserved"]}
+    pipeline = [
+        {
+            "$group": {
+                "_id": {
+                    "location": {"$ifNull": ["$location", "unknown"]},
+                    "category": {"$ifNull": ["$category", "unknown"]},
+                    "name": {"$ifNull": ["$name", "unknown"]},
+                },
+                "available": {"$sum": {"$cond": [is_reserved, 0, 1]}},
+                "reserved": {"$sum": {"$cond": [is_reserved, 1, 0]}},
+            }
+        }
+    ]
+    rows = [
+        {**row["_id"], "available": row["available"], "reserved": row["reserved"]}
+        async for row in await db.items.aggregate(pipeline)
+    ]
+
+    # compare against the maintained counters before replacing them
+    def key(row):
+        return (row["location"], row["category"], row["name"])
+    expected = {key(row): (row["available"], row["reserved"]) for row in rows}
+    current = {
+        key(row): (row.get("available", 0), row.get("reserved", 0))
+        async for row in db.skus.find({}, {"_id": 0})
+        if row.get("available", 0) or row.get("reserved", 0)
+    }
+    mismatched = sum(1 for k in expected.keys() | current.keys() if expected.get(k) != current.get(k))
+
+    await db.skus.delete_many({})
+    if rows:
+        await db.skus.insert_many(rows)
+    await response_cache.invalidate("items")
+    return len(rows), mismatched
+
+@app.post("/items/counts/rebuild")
+async def rebuild_counts():
+    """Recompute the stock counters from the raw items (consistency check)"""
+    if ITEM_STORAGE != "units":
+        return {"error": "db.skus is the stock itself in sku mode, nothing to rebuild from"}
+    count, mismatched = await rebuild_item_counts()
+    return {"status": "rebuilt item counts", "count": count, "mismatched": mismatched}
+
+def status_counts():
+    """$group accumulators summing SKU documents into overall/available/reserved"""
+    return {
+        "overall": {"$sum": {"$add": ["$available", "$reserved"]}},
+        "available": {"$sum": "$available"},
+        "reserved": {"$sum": "$reserved"},
+    }
+
+def item_detail_pipeline(category, item_name):
+    """Totals and per-location counts for one item in a single $facet round trip"""
+    return [
+        {"$match": {"category": category, "name": item_name}},
+        {
+            "$facet": {
+                "totals": [{"$group": {"_id": None, **status_counts()}}],
+                "per_location": [
+                    {"$group": {"_id": "$location", **status_counts()}},
+                    {"$match": {"overall": {"$gt": 0}}},
+                    {"$sort": {"_id": 1}},
+                ],
+            }
+        },
+    ]
+
+# the cached response bypasses response_model, LocationList only documents it
+@app.get("/locations", responses={200: {"model": LocationList}})
+@response_cache.cached("locations")
+async def get_locations():
     """List all locations"""
-    locations = list(db.locations.find({}, {"_id": 0}))
+    locations = await db.locations.find({}, {"_id": 0}).to_list()
     return {"locations": locations}
 
 # NEW SAMPLE
@@ -239,105 +987,299 @@ sample_items = [
 
 # Route to populate MongoDB
 @app.post("/items/populate")
-def populate_items():
+async def populate_items():
     """Populate MongoDB with structured sample items"""
-    db.items.delete_many({})  # clear existing data
-    db.items.insert_many(sample_items)
+    if ITEM_STORAGE != "units":
+        await db.skus.delete_many({})  # clear existing data
+        await bump_item_counts(count_deltas(sample_items))
+        return {"status": "inserted sample items", "count": len(sample_items)}
+    await db.items.delete_many({})  # clear existing data
+    await db.items.insert_many([dict(i) for i in sample_items])  # insert_many adds _id to its arguments
+    await rebuild_item_counts()
     return {"status": "inserted sample items", "count": len(sample_items)}
 
 # Sample locations dataset
 sample_locations = [
     {
-        "name": "AOZ Central Warehouse",
-        "address": "Bahnhofstrasse 10",
-        "postal_code": "8001"
+        "name": "Zentraldepot Zürich",
+        "address": "Lagerstrasse 33",
+        "postal_code": "8004",
+        "code": "loc_centrum",
+        "coordinates": {"type": "Point", "coordinates": [8.5322, 47.3776]},
     },
     {
-        "name": "AOZ Food Hub",
-        "address": "Sihlstrasse 15",
-        "postal_code": "8005"
+        "name": "Lagerhaus Zürich-West",
+        "address": "Förrlibuckstrasse 180",
+        "postal_code": "8005",
+        "code": "loc_west",
+        "coordinates": {"type": "Point", "coordinates": [8.5085, 47.3893]},
     },
     {
-        "name": "AOZ Bedding Center",
-        "address": "Europaallee 20",
-        "postal_code": "8004"
+        "name": "Verteilstelle Altstetten",
+        "address": "Hohlstrasse 560",
+        "postal_code": "8048",
+        "code": "loc_altstetten",
+        "coordinates": {"type": "Point", "coordinates": [8.4893, 47.3880]},
     },
     {
-        "name": "AOZ Hygiene Depot",
-        "address": "Werdstrasse 35",
-        "postal_code": "8002"
+        "name": "Zentrum Oerlikon Depot",
+        "address": "Schaffhauserstrasse 400",
+        "postal_code": "8050",
+        "code": "loc_oerlikon",
+        "coordinates": {"type": "Point", "coordinates": [8.5468, 47.4087]},
     },
     {
-        "name": "AOZ Outlet Zürich West",
-        "address": "Pfingstweidstrasse 100",
-        "postal_code": "8005"
+        "name": "Lager Zürich-West End",
+        "address": "Pfingstweidstrasse 102",
+        "postal_code": "8005",
+        "code": "loc_zuerichwest",
+        "coordinates": {"type": "Point", "coordinates": [8.5118, 47.3902]},
     },
 ]
 
 # Route to populate locations
 @app.post("/locations/populate")
-def populate_locations():
+async def populate_locations():
     """Populate MongoDB with sample locations"""
-    db.locations.delete_many({})  # clear existing data
-    db.locations.insert_many(sample_locations)
+    await db.locations.delete_many({})  # clear existing data
+    await db.locations.insert_many([dict(l) for l in sample_locations])
+    await load_location_index()
+    await announce_change("locations")
     return {"status": "inserted sample locations", "count": len(sample_locations)}
 
-@app.get("/mongo/test")
-def test_mongo():
-    """Check if MongoDB connection works"""
-    try:
-        db.list_collection_names()
-        return {"mongo": "connected"}
-    except Exception as e:
-        return {"mongo": "connection failed", "error": str(e)}
+# --- Availability search ---
+# Distances between postal codes and locations are computed once when the
+# locations are loaded, a search then only reads the SKU documents of one item.
+
+# approximate centre of the Zurich postal code areas (lon, lat)
+postal_code_coordinates = {
+    "8001": (8.5417, 47.3717), "8002": (8.5300, 47.3630), "8003": (8.5150, 47.3720),
+    "8004": (8.5240, 47.3790), "8005": (8.5170, 47.3890), "8006": (8.5440, 47.3880),
+    "8008": (8.5560, 47.3560), "8032": (8.5600, 47.3700), "8037": (8.5270, 47.3960),
+    "8038": (8.5300, 47.3420), "8041": (8.5130, 47.3300), "8044": (8.5640, 47.3800),
+    "8045": (8.5050, 47.3600), "8046": (8.5080, 47.4200), "8047": (8.4900, 47.3750),
+    "8048": (8.4870, 47.3880), "8049": (8.4950, 47.4020), "8050": (8.5450, 47.4100),
+    "8051": (8.5720, 47.4060), "8052": (8.5450, 47.4230), "8053": (8.5870, 47.3600),
+    "8055": (8.5050, 47.3650), "8057": (8.5450, 47.4000), "8064": (8.4850, 47.3850),
+}
+
+# location code -> location document, and postal code -> {location code: km}
+location_index = {}
+location_distances = {}
+
+def distance_km(a, b):
+    """Haversine distance between two (lon, lat) points"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+async def load_location_index():
+    location_index.clear()
+    location_distances.clear()
+    async for doc in db.locations.find({"code": {"$exists": True}}, {"_id": 0}):
+        location_index[doc["code"]] = doc
+    for postal_code, origin in postal_code_coordinates.items():
+        location_distances[postal_code] = {
+            code: round(distance_km(origin, tuple(doc["coordinates"]["coordinates"])), 2)
+            for code, doc in location_index.items() if "coordinates" in doc
+        }
+    await response_cache.invalidate("locations")
+
+@app.get("/availability")
+@response_cache.cached("items", "locations")
+async def get_availability(
+    name: str = Query(..., description="e.g. Decke"),
+    qty: int = Query(1, ge=1),
+    near: str = Query(..., description="postal code, e.g. 8005"),
+):
+    """
+    Locations that have the item available, locations that can supply the whole
+    quantity first, each group ordered by distance to the postal code.
+    """
+    distances = location_distances.get(near)
+    if distances is None:
+        return {"error": "Unknown postal code"}
+
+    results = []
+    async for sku in db.skus.find({"name": name, "available": {"$gt": 0}}, {"_id": 0}):
+        location = location_index.get(sku["location"], {})
+        results.append({
+            "location": sku["location"],
+            "name": location.get("name", sku["location"]),
+            "address": location.get("address", ""),
+            "postal_code": location.get("postal_code", ""),
+            "distance_km": distances.get(sku["location"]),
+            "available": sku["available"],
+            "sufficient": sku["available"] >= qty,
+        })
+
+    # unknown distances (locations without coordinates) go last
+    results.sort(key=lambda r: (not r["sufficient"], r["distance_km"] is None, r["distance_km"] or 0))
+    total = sum(r["available"] for r in results)
+    return {
+        "name": name,
+        "qty": qty,
+        "near": near,
+        "total_available": total,
+        "fulfillable": total >= qty,
+        "locations": results,
+    }
+
 
 
 # Helper function to convert MongoDB document to dict
 def user_to_dict(doc):
+    # null or non-string fields written by a client come back as strings
     return {
         "id": str(doc["_id"]),
-        "firstName": doc.get("firstName", ""),
-        "lastName": doc.get("lastName", ""),
-        "address": doc.get("address", ""),
-        "phoneNumber": doc.get("phoneNumber", ""),
-        "status": doc.get("status", ""),
-        "role": doc.get("role", ""),
-        "comments": doc.get("comments", "")
+        "firstName": as_text(doc.get("firstName")) or "",
+        "lastName": as_text(doc.get("lastName")) or "",
+        "address": as_text(doc.get("address")) or "",
+        "phoneNumber": as_text(doc.get("phoneNumber")) or "",
+        "status": as_text(doc.get("status")) or "",
+        "role": as_text(doc.get("role")) or "",
+        "comments": as_text(doc.get("comments")) or ""
     }
 
-@app.get("/users")
-def get_users():
-    users = users_collection.find()
-    return [user_to_dict(u) for u in users]
+# only the fields user_to_dict reads are fetched
+user_projection = {f: 1 for f in ("firstName", "lastName", "address", "phoneNumber", "status", "role", "comments")}
+user_sort_fields = ("lastName", "firstName", "_id")
+
+def encode_user_cursor(value, user_id):
+    return base64.urlsafe_b64encode(orjson.dumps([value, user_id])).decode()
+
+def user_cursor_filter(field, direction, after):
+    """Keyset condition for the page after (sort value, _id) of the last user"""
+    try:
+        value, user_id = orjson.loads(base64.urlsafe_b64decode(after))
+        user_id = ObjectId(user_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if field == "_id":
+        return {"_id": {op: user_id}}
+    # null and missing sort before every other value, and $gt/$lt only
+    # compare within a type, so they need their own conditions
+    if value is None:
+        if direction == ASCENDING:
+            return {"$or": [{field: {"$ne": None}}, {field: None, "_id": {op: user_id}}]}
+        return {field: None, "_id": {op: user_id}}
+    conditions = [{field: {op: value}}, {field: value, "_id": {op: user_id}}]
+    if direction == DESCENDING:
+        conditions.append({field: None})
+    return {"$or": conditions}
+
+@app.get("/users", response_model=UserPage)
+async def get_users(
+    after: str | None = Query(None, description="next from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    status: str | None = None,
+    role: str | None = None,
+    prefix: str | None = Query(None, description="start of the first or last name"),
+    q: str | None = Query(None, description="words in names or comments (text index)"),
+    sort: str = Query("lastName", description="lastName, firstName or _id, prefix - for descending"),
+):
+    """List users one page at a time, filtered and sorted on the server"""
+    field = sort.lstrip("-")
+    if field not in user_sort_fields:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(user_sort_fields)}")
+    direction = DESCENDING if sort.startswith("-") else ASCENDING
+
+    conditions = [{k: v for k, v in {"status": status, "role": role}.items() if v is not None}]
+    if prefix:
+        # anchored, Mongo only checks the name index keys instead of loading every user
+        pattern = {"$regex": "^" + re.escape(prefix), "$options": "i"}
+        conditions.append({"$or": [{"firstName": pattern}, {"lastName": pattern}]})
+    if q:
+        conditions.append({"$text": {"$search": q}})
+    if after:
+        conditions.append(user_cursor_filter(field, direction, after))
+    query = {"$and": conditions} if len(conditions) > 1 else conditions[0]
+
+    sort_keys = [(field, direction)] if field == "_id" else [(field, direction), ("_id", direction)]
+    docs = await db.users.find(query, user_projection).sort(sort_keys).limit(limit).to_list()
+
+    next_cursor = None
+    if len(docs) == limit:
+        # the stored value, user_to_dict turns a missing name into ""
+        last = docs[-1]
+        value = str(last["_id"]) if field == "_id" else last.get(field)
+        next_cursor = encode_user_cursor(value, str(last["_id"]))
+    return {"users": [user_to_dict(doc) for doc in docs], "next": next_cursor}
+
+def user_object_id(user_id):
+    try:
+        return ObjectId(user_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail="Benutzer nicht gefunden")
+
+# fields PATCH /users/bulk may change
+user_bulk_fields = ("status", "role")
+
+@app.patch("/users/bulk")
+async def update_users_bulk(rows: list[dict]):
+    """
+    Change status/role of many users in one bulk_write, e.g.
+    [{"id": "...", "status": "Deaktiviert"}, {"id": "...", "role": "Admin"}]
+    """
+    ops, errors = [], []
+    for i, row in enumerate(rows):
+        changes = {f: row[f] for f in user_bulk_fields if f in row}
+        try:
+            user_id = ObjectId(row.get("id"))
+        except (InvalidId, TypeError):
+            errors.append({"row": i, "error": "invalid id"})
+            continue
+        if not changes:
+            errors.append({"row": i, "error": f"nothing to change, allowed: {', '.join(user_bulk_fields)}"})
+            continue
+        ops.append(UpdateOne({"_id": user_id}, {"$set": changes}))
+
+    matched = modified = 0
+    if ops:
+        result = await db.users.bulk_write(ops, ordered=False)
+        matched, modified = result.matched_count, result.modified_count
+    return {"status": "updated", "matched": matched, "modified": modified, "errors": errors}
 
 @app.get("/users/{user_id}")
-def get_user(user_id: str):
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+async def get_user(user_id: str):
+    user = await db.users.find_one({"_id": user_object_id(user_id)}, user_projection)
     if not user:
         return {}
     return user_to_dict(user)
 
-@app.put("/users/{user_id}")
-def update_user(user_id: str, user_data: dict):
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": user_data})
-    updated_user = users_collection.find_one({"_id": ObjectId(user_id)})
+@app.put("/users/{user_id}", response_model=User)
+async def update_user(user_id: str, user_data: dict):
+    # the page sends the whole user back, its id is not a field to store
+    user_data = {k: v for k, v in user_data.items() if k not in ("id", "_id")}
+    # one round trip, Mongo returns the document after the update
+    updated_user = await db.users.find_one_and_update(
+        {"_id": user_object_id(user_id)},
+        {"$set": user_data},
+        projection=user_projection,
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="Benutzer nicht gefunden")
     return user_to_dict(updated_user)
 
-@app.post("/users")
-def create_user(user_data: dict):
-    result = users_collection.insert_one(user_data)
-    new_user = users_collection.find_one({"_id": result.inserted_id})
-    return user_to_dict(new_user)
+@app.post("/users", response_model=User)
+async def create_user(user_data: dict):
+    # ids are assigned by Mongo, a client sent _id would make the user unreachable
+    user_data = {k: v for k, v in user_data.items() if k not in ("id", "_id")}
+    # insert_one sets _id on the payload, no need to read the user back
+    await db.users.insert_one(user_data)
+    return user_to_dict(user_data)
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: str):
-    users_collection.delete_one({"_id": ObjectId(user_id)})
+async def delete_user(user_id: str):
+    await db.users.delete_one({"_id": user_object_id(user_id)})
     return {"message": "Benutzer gelöscht"}
 
 @app.post("/users/populate")
-def populate_users():
-    users_collection.delete_many({})  # clear existing data
-    users_collection.insert_many(sample_users)
+async def populate_users():
+    await db.users.delete_many({})  # clear existing data
+    await db.users.insert_many([dict(u) for u in sample_users])
     return {"status": "inserted sample users", "count": len(sample_users)}
 
 sample_users = [
@@ -406,134 +1348,575 @@ sample_users = [
     }
 ]
 
-@app.get("/items/bedding")
-def get_bedding():
-    """Return total count of bedding items by type (no status differentiation)"""
+@app.get("/stream/stock")
+async def stream_stock(request: Request, location: str | None = None):
+    """
+    Server-sent events with stock deltas per location/SKU, e.g.
+    {"location": "loc_west", "name": "Decke", "available": 12, "delta_available": -2, ...}
+    """
+    queue = stock_feed.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if location and event["location"] != location:
+                    continue
+                yield "event: stock\ndata: " + orjson.dumps(event).decode() + "\n\n"
+        finally:
+            stock_feed.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# --- Reservations ---
+# A reservation moves quantity from available to reserved with one conditional
+# update on db.skus (available >= n), so parallel coordinators can't oversell.
+# Holds with hold_minutes expire and are released by reservation_sweeper().
+
+RESERVATION_SWEEP_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+
+def reservation_to_dict(doc):
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+async def claim_units(sku, quantity, reservation_id):
+    """Tag `quantity` available unit documents with the reservation (units mode)"""
+    claimed = 0
+    while claimed < quantity:
+        ids = [
+            doc["_id"]
+            async for doc in db.items.find({**sku, "status": "available"}, {"_id": 1}).limit(quantity - claimed)
+        ]
+        if not ids:
+            break
+        # units taken by a parallel claim in the meantime simply don't match
+        result = await db.items.update_many(
+            {"_id": {"$in": ids}, "status": "available"},
+            {"$set": {"status": "reserved", "reservation_id": reservation_id}},
+        )
+        claimed += result.modified_count
+    return claimed
+
+async def release_reservation(reservation):
+    """Give the reserved quantity back to available"""
+    sku = sku_key(reservation)
+    await move_sku_quantity(sku, "reserved", "available", reservation["quantity"])
+    if ITEM_STORAGE == "units":
+        await db.items.update_many(
+            {"reservation_id": reservation["_id"]},
+            {"$set": {"status": "available"}, "$unset": {"reservation_id": ""}},
+        )
+
+@app.post("/reservations")
+async def create_reservation(reservation: dict):
+    """
+    Reserve N available units of a SKU at a location, e.g.
+    {"name": "Schlafsack", "category": "bedding", "location": "loc_west", "quantity": 2, "hold_minutes": 30}
+    Without hold_minutes the reservation stays until it is deleted.
+    """
+    try:
+        quantity = validate_bulk_row(reservation)
+    except ValueError as e:
+        return {"error": str(e)}
+    hold_minutes = reservation.get("hold_minutes")
+    if hold_minutes is not None and (type(hold_minutes) is not int or hold_minutes < 1):
+        return {"error": "hold_minutes must be a positive integer"}
+    sku = sku_key(reservation)
+
+    if not await move_sku_quantity(sku, "available", "reserved", quantity):
+        stock = await db.skus.find_one(sku, {"_id": 0, "available": 1})
+        return {"error": "Not enough stock", "requested": quantity, "available": (stock or {}).get("available", 0)}
+
+    now = datetime.now(timezone.utc)
+    doc = {
+        **sku,
+        "_id": ObjectId(),
+        "quantity": quantity,
+        "status": "held",
+        "created_at": now,
+        "expires_at": now + timedelta(minutes=hold_minutes) if hold_minutes else None,
+    }
+    try:
+        if ITEM_STORAGE == "units":
+            claimed = await claim_units(sku, quantity, doc["_id"])
+            if claimed < quantity:
+                # counters and unit documents drifted apart, only keep what was tagged
+                await move_sku_quantity(sku, "reserved", "available", quantity - claimed)
+                doc["quantity"] = claimed
+                if not claimed:
+                    return {"error": "Not enough stock", "requested": quantity, "available": 0}
+        await db.reservations.insert_one(doc)
+    except BaseException:
+        # no reservation document means nothing would ever release the stock
+        await release_reservation(doc)
+        raise
+    return reservation_to_dict(doc)
+
+@app.get("/reservations/{reservation_id}")
+async def get_reservation(reservation_id: str):
+    try:
+        reservation = await db.reservations.find_one({"_id": ObjectId(reservation_id)})
+    except InvalidId:
+        return {"error": "Reservation not found"}
+    if not reservation:
+        return {"error": "Reservation not found"}
+    return reservation_to_dict(reservation)
+
+@app.delete("/reservations/{reservation_id}")
+async def delete_reservation(reservation_id: str):
+    """Release a reservation, the units become available again"""
+    try:
+        query = {"_id": ObjectId(reservation_id), "status": "held"}
+    except InvalidId:
+        return {"error": "Reservation not found"}
+    # flipping the status first makes sure only one caller releases the stock
+    reservation = await db.reservations.find_one_and_update(query, {"$set": {"status": "released"}})
+    if not reservation:
+        return {"error": "Reservation not found"}
+    await release_reservation(reservation)
+    return {"status": "released", "id": reservation_id}
+
+async def release_expired_reservations():
+    """Release all holds past their expiry, returns how many were released"""
+    released = 0
+    while True:
+        reservation = await db.reservations.find_one_and_update(
+            {"status": "held", "expires_at": {"$lte": datetime.now(timezone.utc)}},
+            {"$set": {"status": "expired"}},
+        )
+        if not reservation:
+            return released
+        await release_reservation(reservation)
+        released += 1
+
+async def reservation_sweeper():
+    while True:
+        try:
+            released = await release_expired_reservations()
+            if released:
+                print(f"Released {released} expired reservations.")
+        except Exception as e:
+            print("Reservation sweep failed:", e)
+        await asyncio.sleep(RESERVATION_SWEEP_SECONDS)
+
+# --- Stock history ---
+# Every STOCK_SNAPSHOT_SECONDS the counts of all SKUs are written to the
+# time-series collection stock_history (one small document per SKU, Mongo
+# buckets them per SKU and hour). Old snapshots expire after STOCK_HISTORY_DAYS.
+
+STOCK_SNAPSHOT_SECONDS = int(os.getenv("STOCK_SNAPSHOT_SECONDS", "300"))
+STOCK_HISTORY_DAYS = int(os.getenv("STOCK_HISTORY_DAYS", "90"))
+
+# bucket -> $dateTrunc unit, with the longest range a series may cover
+history_buckets = {
+    "minute": ("minute", timedelta(days=2)),
+    "hour": ("hour", timedelta(days=90)),
+    "day": ("day", timedelta(days=3 * 365)),
+    "week": ("week", timedelta(days=10 * 365)),
+}
+
+def as_utc(value):
+    """Times without an offset are taken as UTC, like Mongo stores them"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+async def ensure_stock_history():
+    """Create the time-series collection, it can not be turned into one later"""
+    if "stock_history" in await db.list_collection_names():
+        return
+    await db.create_collection(
+        "stock_history",
+        timeseries={"timeField": "ts", "metaField": "sku", "granularity": "minutes"},
+        expireAfterSeconds=STOCK_HISTORY_DAYS * 24 * 3600,
+    )
+
+async def snapshot_stock():
+    """Write the current count of every SKU, returns the number of documents"""
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    snapshot = [
+        {
+            "ts": now,
+            "sku": {"location": doc.get("location"), "category": doc.get("category"), "name": doc.get("name")},
+            "available": doc.get("available", 0),
+            "reserved": doc.get("reserved", 0),
+        }
+        async for doc in db.skus.find({}, {"_id": 0})
+    ]
+    if snapshot:
+        await db.stock_history.insert_many(snapshot)
+    return len(snapshot)
+
+async def stock_snapshotter():
+    while True:
+        await asyncio.sleep(STOCK_SNAPSHOT_SECONDS)
+        if not boot_state["ready"]:
+            continue
+        try:
+            await snapshot_stock()
+        except Exception as e:
+            print("Stock snapshot failed:", e)
+
+@app.get("/items/{name}/history")
+async def get_item_history(
+    name: str,
+    location: str | None = None,
+    category: str | None = None,
+    start: datetime | None = Query(None, alias="from", description="default: 7 days before to"),
+    end: datetime | None = Query(None, alias="to", description="default: now"),
+    bucket: str = Query("hour", description="minute, hour, day or week"),
+):
+    """
+    Stock of one item over time, summed over all locations or for one. Each
+    point holds the last snapshot of its bucket, e.g. the stock at the end of the day.
+    """
+    if bucket not in history_buckets:
+        return {"error": f"bucket must be one of {', '.join(history_buckets)}"}
+    unit, max_range = history_buckets[bucket]
+    end = as_utc(end) if end else datetime.now(timezone.utc)
+    start = as_utc(start) if start else end - min(timedelta(days=7), max_range)
+    if start >= end:
+        return {"error": "from must be before to"}
+    if end - start > max_range:
+        return {"error": f"range too long for bucket={bucket}, at most {max_range.days} days"}
+
+    match = {"sku.name": name, "ts": {"$gte": start, "$lt": end}}
+    if location:
+        match["sku.location"] = location
+    if category:
+        match["sku.category"] = category
     pipeline = [
-        {"$match": {"category": "bedding"}},
+        {"$match": match},
+        {"$sort": {"ts": 1}},
+        # closing count of every SKU per bucket ...
         {
             "$group": {
-                "_id": "$name",
-                "count": {"$sum": 1}
+                "_id": {"t": {"$dateTrunc": {"date": "$ts", "unit": unit}}, "sku": "$sku"},
+                "available": {"$last": "$available"},
+                "reserved": {"$last": "$reserved"},
             }
         },
-        {"$sort": {"_id": 1}}
+        # ... summed over the matching SKUs
+        {
+            "$group": {
+                "_id": "$_id.t",
+                "available": {"$sum": "$available"},
+                "reserved": {"$sum": "$reserved"},
+            }
+        },
+        {"$sort": {"_id": 1}},
     ]
+    points = [
+        {"t": row["_id"], "available": row["available"], "reserved": row["reserved"]}
+        async for row in await db.stock_history.aggregate(pipeline)
+    ]
+    return {"name": name, "location": location, "bucket": bucket, "from": start, "to": end, "points": points}
+
+# --- Indexes ---
+# Created at startup (create_index is a no-op when the index already exists).
+
+indexes = {
+    "items": [
+        [("location", ASCENDING), ("category", ASCENDING), ("name", ASCENDING), ("status", ASCENDING)],
+        [("category", ASCENDING), ("name", ASCENDING), ("location", ASCENDING)],
+    ],
+    "skus": [
+        [("location", ASCENDING), ("category", ASCENDING), ("name", ASCENDING)],
+        [("category", ASCENDING), ("name", ASCENDING), ("location", ASCENDING)],
+        [("name", ASCENDING), ("available", ASCENDING)],
+    ],
+    "reservations": [
+        [("status", ASCENDING), ("expires_at", ASCENDING)],
+    ],
+    "stock_history": [
+        [("sku.name", ASCENDING), ("sku.location", ASCENDING), ("ts", ASCENDING)],
+    ],
+    "users": [
+        # filter + sort + keyset of GET /users
+        [("status", ASCENDING), ("lastName", ASCENDING), ("_id", ASCENDING)],
+        [("role", ASCENDING), ("lastName", ASCENDING), ("_id", ASCENDING)],
+        [("lastName", ASCENDING), ("_id", ASCENDING)],
+        [("firstName", ASCENDING), ("_id", ASCENDING)],
+        [("firstName", TEXT), ("lastName", TEXT), ("comments", TEXT)],
+    ],
+}
+
+async def ensure_indexes():
+    for collection, keys_list in indexes.items():
+        for keys in keys_list:
+            # a SKU is identified by location, category and name
+            unique = collection == "skus" and keys == indexes["skus"][0]
+            await db[collection].create_index(keys, unique=unique)
+
+# Every filter/sort shape the API sends to Mongo, with example values.
+query_shapes = [
+    {"route": "GET /items/by_location", "collection": "skus", "filter": {"location": "loc_centrum"}},
+    {"route": "GET /items/{category}", "collection": "skus", "filter": {"category": "bedding"}},
+    {"route": "GET /items/{category}/{item_name}", "collection": "skus",
+     "filter": {"category": "bedding", "name": "Bett"}},
+    {"route": "GET /availability", "collection": "skus", "filter": {"name": "Decke", "available": {"$gt": 0}}},
+    {"route": "POST /items (counter update)", "collection": "skus",
+     "filter": {"location": "loc_centrum", "category": "bedding", "name": "Bett"}},
+    {"route": "GET /items/{name}/history", "collection": "stock_history",
+     "filter": {"sku.name": "Decke", "sku.location": "loc_centrum", "ts": {"$gte": datetime(2025, 1, 1)}}},
+    {"route": "reservation sweeper", "collection": "reservations",
+     "filter": {"status": "held", "expires_at": {"$lte": datetime(2025, 1, 1)}}},
+    {"route": "items by location", "collection": "items", "filter": {"location": "loc_centrum"}},
+    {"route": "items by category and name", "collection": "items", "filter": {"category": "bedding", "name": "Bett"}},
+    {"route": "GET /users?status=", "collection": "users", "filter": {"status": "Aktiv"},
+     "sort": [("lastName", ASCENDING), ("_id", ASCENDING)]},
+    {"route": "GET /users?role=", "collection": "users", "filter": {"role": "Admin"},
+     "sort": [("lastName", ASCENDING), ("_id", ASCENDING)]},
+    {"route": "GET /users", "collection": "users", "filter": {}, "sort": [("lastName", ASCENDING), ("_id", ASCENDING)]},
+    {"route": "GET /users?prefix=", "collection": "users",
+     "filter": {"$or": [{"firstName": {"$regex": "^Jo"}}, {"lastName": {"$regex": "^Jo"}}]}},
+    {"route": "GET /users?q=", "collection": "users", "filter": {"$text": {"$search": "Kreis"}}},
+]
 
-    result = list(db.items.aggregate(pipeline))
-    # Convert MongoDB aggregation output into a simple dictionary
-    summary = {item["_id"]: item["count"] for item in result}
-
-    return {"bedding_summary": summary}
-
-@app.get("/items/bedding/{item_name}")
-def get_bedding_item_detail(item_name: str):
-    # Fetch all items in the bedding category with that name
-    cursor = db.items.find({"category": "bedding", "name": item_name})
-    items = list(cursor)
-
-    if not items:
-        return {"error": "Item not found"}
-
-    total_count = len(items)
-    available_count = sum(1 for i in items if i.get("status") == "available")
-    reserved_count = sum(1 for i in items if i.get("status") == "reserved")
+def plan_stages(plan):
+    """Collect all stage names of an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Route latency and Mongo command stats in Prometheus text format"""
+    # summed over all workers, the others as of their last publish
+    combined = Metrics()
+    combined.merge(metrics)
+    for state in await other_workers():
+        combined.merge(state["metrics"])
+    return PlainTextResponse(combined.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the response cache"""
+    stats = await response_cache.stats()
+    others = await other_workers()
+    for state in others:
+        stats["hits"] += state["cache"]["hits"]
+        stats["misses"] += state["cache"]["misses"]
+        stats["errors"] += state["cache"]["errors"]
+    stats["workers"] = 1 + len(others)
+    return stats
+
+@app.get("/admin/indexes")
+async def get_index_report():
+    """Index list per collection plus the explain() plan of every query shape"""
+    report = []
+    for shape in query_shapes:
+        cursor = db[shape["collection"]].find(shape["filter"])
+        if "sort" in shape:
+            cursor = cursor.sort(shape["sort"])
+        try:
+            stages = plan_stages((await cursor.explain())["queryPlanner"]["winningPlan"])
+        except Exception as e:
+            report.append({**shape, "error": str(e)})
+            continue
+        report.append({**shape, "stages": stages, "collscan": "COLLSCAN" in stages})
+
+    index_keys = {}
+    for name in indexes:
+        index_keys[name] = [index["key"] async for index in await db[name].list_indexes()]
 
-    # Count per location
-    per_location = defaultdict(lambda: {"overall": 0, "available": 0, "reserved": 0})
-    for item in items:
-        loc = item.get("location", "unknown")
-        per_location[loc]["overall"] += 1
-        if item.get("status") == "available":
-            per_location[loc]["available"] += 1
-        elif item.get("status") == "reserved":
-            per_location[loc]["reserved"] += 1
-
-    # Convert defaultdict to regular dict
-    per_location = dict(per_location)
-
-    # You can store descriptions in Mongo, but here’s an example fallback:
-    description_map = {
-        "Bett": "80 cm breites, faltbares Feldbett für Flüchtlingsunterkünfte",
-        "Decke": "Warme Wolldecke, geeignet für kalte Nächte",
-        "Kissen": "Weiches Kopfkissen aus Baumwolle",
-        "Schlafsack": "Leichter Schlafsack für den Notfalleinsatz",
+    return {
+        "indexes": index_keys,
+        "queries": report,
+        "collscans": sum(1 for q in report if q.get("collscan")),
     }
 
-    description = description_map.get(item_name, "Keine Beschreibung verfügbar.")
+# --- Item categories ---
+# The catalog is seeded into db.categories and loaded once at startup into
+# category_catalog, so adding a category is a data change and no request
+# has to build description maps.
 
-    return {
-        "name": item_name,
-        "description": description,
-        "overall": total_count,
-        "available": available_count,
-        "reserved": reserved_count,
-        "per_location": per_location,
-    }
+sample_categories = [
+    {
+        "key": "bedding",
+        "label": "Bettwaren",
+        "descriptions": {
+            "Bett": "80 cm breites, faltbares Feldbett für Flüchtlingsunterkünfte",
+            "Decke": "Warme Wolldecke, geeignet für kalte Nächte",
+            "Kissen": "Weiches Kopfkissen aus Baumwolle",
+            "Schlafsack": "Leichter Schlafsack für den Notfalleinsatz",
+        },
+    },
+    {
+        "key": "hygiene",
+        "label": "Hygiene",
+        "descriptions": {
+            "Kasten Zahnbürste": "Standard-Zahnbürste für Erwachsene.",
+            "Kasten Zahnpasta": "100ml Tube mit Fluorid-Zahnpasta.",
+            "Seife": "Handseife in Stückform, neutraler Duft.",
+            "Tuch": "Baumwollhandtuch, 70x140 cm, weiß.",
+            "WC-Papier": "Toilettenpapier, 3-lagig.",
+            "Shampoo": "250ml Flasche mildes Shampoo für alle Haartypen.",
+            "Duschgel": "Duschgel für tägliche Körperpflege, 300ml.",
+        },
+    },
+    {"key": "food", "label": "Lebensmittel", "descriptions": {}},
+    {"key": "clothing", "label": "Kleidung", "descriptions": {}},
+    {"key": "family", "label": "Kinder & Familie", "descriptions": {}},
+    {"key": "medical", "label": "Medizin & Erste Hilfe", "descriptions": {}},
+    {"key": "other", "label": "Werkzeuge & Ausrüstung", "descriptions": {}},
+]
+
+# category key -> {"label": ..., "descriptions": {item name: text}}
+category_catalog = {}
+# lower-cased label -> category key, the frontend links categories by label
+category_labels = {}
+
+async def load_category_catalog():
+    category_catalog.clear()
+    category_labels.clear()
+    async for doc in db.categories.find({}, {"_id": 0}):
+        category_catalog[doc["key"]] = {
+            "label": doc.get("label", doc["key"]),
+            "descriptions": doc.get("descriptions", {}),
+        }
+        category_labels[category_catalog[doc["key"]]["label"].lower()] = doc["key"]
+    await response_cache.invalidate("categories")
+
+def category_key(category):
+    """Catalog key for a key or a label (any case), None if unknown"""
+    if category in category_catalog:
+        return category
+    return category_labels.get(category.lower())
+
+@app.post("/categories/populate")
+async def populate_categories():
+    """Populate MongoDB with the sample category catalog and reload it"""
+    await db.categories.delete_many({})  # clear existing data
+    await db.categories.insert_many([dict(c) for c in sample_categories])
+    await load_category_catalog()
+    await announce_change("categories")
+    return {"status": "inserted sample categories", "count": len(sample_categories)}
+
+@app.get("/categories")
+@response_cache.cached("categories")
+async def get_categories():
+    """List all item categories"""
+    return {"categories": [{"key": key, "label": c["label"]} for key, c in category_catalog.items()]}
+
+@app.get("/items/{category}")
+@response_cache.cached("items", "categories")
+async def get_category_summary(category: str):
+    """Return total count of items in a category by type (no status differentiation)"""
+    category = category_key(category)
+    if category is None:
+        return {"error": "Category not found"}
 
-@app.get("/items/hygiene")
-def get_hygiene():
-    """Return total count of hygiene items by type (no status differentiation)"""
     pipeline = [
-        {"$match": {"category": "hygiene"}},
+        {"$match": {"category": category}},
         {
             "$group": {
                 "_id": "$name",
-                "count": {"$sum": 1}
+                "count": {"$sum": {"$add": ["$available", "$reserved"]}}
             }
         },
+        {"$match": {"count": {"$gt": 0}}},
         {"$sort": {"_id": 1}}
     ]
 
-    result = list(db.items.aggregate(pipeline))
+    result = await (await db.skus.aggregate(pipeline)).to_list()
     # Convert MongoDB aggregation output into a simple dictionary
     summary = {item["_id"]: item["count"] for item in result}
 
-    return {"hygiene_summary": summary}
+    return {f"{category}_summary": summary}
 
+@app.get("/items/{category}/{item_name}")
+@response_cache.cached("items", "categories")
+async def get_item_detail(category: str, item_name: str):
+    """Return detailed info about a specific item of a category"""
+    category = category_key(category)
+    if category is None:
+        return {"error": "Category not found"}
 
-@app.get("/items/hygiene/{item_name}")
-def get_hygiene_item_detail(item_name: str):
-    """Return detailed info about a specific hygiene item"""
-    cursor = db.items.find({"category": "hygiene", "name": item_name})
-    items = list(cursor)
+    result = (await (await db.skus.aggregate(item_detail_pipeline(category, item_name))).to_list())[0]
 
-    if not items:
+    if not result["totals"] or result["totals"][0]["overall"] == 0:
         return {"error": "Item not found"}
 
-    total_count = len(items)
-    available_count = sum(1 for i in items if i.get("status") == "available")
-    reserved_count = sum(1 for i in items if i.get("status") == "reserved")
+    totals = result["totals"][0]
 
     # Count per location
-    per_location = defaultdict(lambda: {"overall": 0, "available": 0, "reserved": 0})
-    for item in items:
-        loc = item.get("location", "unknown")
-        per_location[loc]["overall"] += 1
-        if item.get("status") == "available":
-            per_location[loc]["available"] += 1
-        elif item.get("status") == "reserved":
-            per_location[loc]["reserved"] += 1
-
-    per_location = dict(per_location)
-
-    # Basic descriptions (redundant but helpful for demo)
-    description_map = {
-        "Zahnbürste": "Standard-Zahnbürste für Erwachsene.",
-        "Zahnpasta": "100ml Tube mit Fluorid-Zahnpasta.",
-        "Seife": "Handseife in Stückform, neutraler Duft.",
-        "Shampoo": "250ml Flasche mildes Shampoo für alle Haartypen.",
-        "Duschgel": "Duschgel für tägliche Körperpflege, 300ml.",
-        "Handtuch": "Baumwollhandtuch, 70x140 cm, weiß.",
+    per_location = {
+        row["_id"]: {"overall": row["overall"], "available": row["available"], "reserved": row["reserved"]}
+        for row in result["per_location"]
     }
 
-    description = description_map.get(item_name, "Keine Beschreibung verfügbar.")
+    descriptions = category_catalog[category]["descriptions"]
+    description = descriptions.get(item_name, "Keine Beschreibung verfügbar.")
 
     return {
         "name": item_name,
         "description": description,
-        "overall": total_count,
-        "available": available_count,
-        "reserved": reserved_count,
+        "overall": totals["overall"],
+        "available": totals["available"],
+        "reserved": totals["reserved"],
         "per_location": per_location,
-    }
\ No newline at end of file
+    }
+
+
+# --- Seeding ---
+# Idempotent counterpart of the /populate routes: existing documents are
+# matched by their natural key and left alone, so running it on every start
+# (SEED_ON_STARTUP=1) or via `python -m app.seed` never duplicates anything.
+
+async def seed_fixtures():
+    """Upsert the sample data, returns {collection: documents inserted}"""
+    inserted = {}
+
+    result = await db.users.bulk_write([
+        UpdateOne({"firstName": u["firstName"], "lastName": u["lastName"]}, {"$setOnInsert": u}, upsert=True)
+        for u in sample_users
+    ], ordered=False)
+    inserted["users"] = result.upserted_count
+
+    result = await db.locations.bulk_write([
+        UpdateOne({"code": l["code"]}, {"$setOnInsert": l}, upsert=True) for l in sample_locations
+    ], ordered=False)
+    inserted["locations"] = result.upserted_count
+
+    result = await db.categories.bulk_write([
+        UpdateOne({"key": c["key"]}, {"$setOnInsert": c}, upsert=True) for c in sample_categories
+    ], ordered=False)
+    inserted["categories"] = result.upserted_count
+
+    if ITEM_STORAGE == "units":
+        # unit documents have no natural key, only seed an empty collection
+        inserted["items"] = 0
+        if await db.items.estimated_document_count() == 0:
+            await db.items.insert_many([dict(i) for i in sample_items])
+            await rebuild_item_counts()
+            inserted["items"] = len(sample_items)
+    else:
+        deltas = count_deltas(sample_items)
+        skus = {key[:3] for key in deltas}
+        result = await db.skus.bulk_write([
+            UpdateOne(
+                dict(zip(("location", "category", "name"), sku)),
+                {"$setOnInsert": {
+                    "available": deltas.get((*sku, "available"), 0),
+                    "reserved": deltas.get((*sku, "reserved"), 0),
+                }},
+                upsert=True,
+            )
+            for sku in sorted(skus)
+        ], ordered=False)
+        inserted["skus"] = result.upserted_count
+
+    await response_cache.invalidate("items", "locations", "categories")
+    print("Seeded fixtures:", inserted)
+    return inserted
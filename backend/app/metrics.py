@@ -0,0 +1,158 @@
+import time
+
+from pymongo import monitoring
+
+# Latency buckets in seconds, shared by HTTP routes and Mongo commands
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Metrics:
+    """Route latency histograms and Mongo command stats, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.requests = {}  # (method, route, status) -> Histogram
+        self.commands = {}  # (collection, command) -> Histogram
+        self.command_failures = {}  # (collection, command) -> count
+        self.documents = {}  # (collection, command) -> documents returned
+
+    def observe_request(self, method, route, status, seconds):
+        key = (method, route, str(status))
+        self.requests.setdefault(key, Histogram()).observe(seconds)
+
+    def observe_command(self, collection, command, seconds, documents):
+        key = (collection, command)
+        self.commands.setdefault(key, Histogram()).observe(seconds)
+        self.documents[key] = self.documents.get(key, 0) + documents
+
+    def observe_command_failure(self, collection, command):
+        key = (collection, command)
+        self.command_failures[key] = self.command_failures.get(key, 0) + 1
+
+    def merge(self, other):
+        """Add the numbers of another Metrics (e.g. another worker) to this one"""
+        for mine, theirs in ((self.requests, other.requests), (self.commands, other.commands)):
+            for key, histogram in theirs.items():
+                mine.setdefault(key, Histogram(histogram.buckets)).merge(histogram)
+        for mine, theirs in ((self.command_failures, other.command_failures), (self.documents, other.documents)):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) + value
+
+    def render(self):
+        lines = []
+        render_histograms(
+            lines, "http_request_duration_seconds", "HTTP request latency per route",
+            ("method", "route", "status"), self.requests,
+        )
+        render_histograms(
+            lines, "mongo_command_duration_seconds", "MongoDB command latency per collection",
+            ("collection", "command"), self.commands,
+        )
+        render_counters(
+            lines, "mongo_command_failures_total", "Failed MongoDB commands",
+            ("collection", "command"), self.command_failures,
+        )
+        render_counters(
+            lines, "mongo_documents_returned_total", "Documents returned by MongoDB commands",
+            ("collection", "command"), self.documents,
+        )
+        return "\n".join(lines) + "\n"
+
+
+def render_histograms(lines, name, help_text, label_names, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+
+def render_counters(lines, name, help_text, label_names, counters):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for key, value in sorted(counters.items()):
+        lines.append(f"{name}{format_labels(dict(zip(label_names, key)))} {value}")
+
+
+def returned_documents(reply):
+    """Number of documents in a command reply (cursor batches, counts, writes)"""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] else 0
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds per-collection command counts, durations and returned documents into Metrics"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.pending = {}  # request_id -> (collection, command)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = ""  # database level commands (ping, listCollections, ...)
+        self.pending[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def succeeded(self, event):
+        key = self.pending.pop((event.connection_id, event.request_id), None)
+        if key:
+            self.metrics.observe_command(*key, event.duration_micros / 1e6, returned_documents(event.reply))
+
+    def failed(self, event):
+        key = self.pending.pop((event.connection_id, event.request_id), None)
+        if key:
+            self.metrics.observe_command_failure(*key)
+
+
+async def timing_middleware(metrics, request, call_next):
+    start = time.perf_counter()
+    status = 500  # stays for exceptions, the error handler answers them with a 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template (/items/{category}) so the label set stays small
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        metrics.observe_request(request.method, path, status, time.perf_counter() - start)
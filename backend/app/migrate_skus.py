@@ -0,0 +1,33 @@
+"""
+Collapse the one-document-per-unit db.items collection into db.skus
+(one document per location/category/name with available/reserved quantities).
+
+    python -m app.migrate_skus                # build db.skus from db.items
+    python -m app.migrate_skus --drop-units   # ... and remove the unit documents
+
+Afterwards start the backend with ITEM_STORAGE=sku. Stop writes to the API
+while this runs, units added in between would be lost with --drop-units.
+"""
+import argparse
+import asyncio
+
+from app.main import close_client, db, rebuild_item_counts
+
+
+async def migrate(drop_units):
+    units = await db.items.estimated_document_count()
+    skus, mismatched = await rebuild_item_counts()
+    print(f"Collapsed {units} unit documents into {skus} SKU documents ({mismatched} counters were off).")
+    # counter table of the first counter layout, replaced by db.skus
+    await db.item_counts.drop()
+    if drop_units:
+        await db.items.drop()
+        print("Dropped db.items, run the backend with ITEM_STORAGE=sku now.")
+    await close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate db.items to the SKU storage model")
+    parser.add_argument("--drop-units", action="store_true", help="delete the unit documents afterwards")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.drop_units))
@@ -0,0 +1,52 @@
+from pydantic import BaseModel, ConfigDict
+
+# Response models. FastAPI validates the result against them and dumps it to
+# JSON compatible data without jsonable_encoder, FastJSONResponse then encodes
+# that with orjson.
+
+
+class Item(BaseModel):
+    # fields can be left out through ?fields= projection, unknown ones are kept
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    name: str | None = None
+    category: str | None = None
+    status: str | None = None
+    location: str | None = None
+    # quantities, set on SKU documents (ITEM_STORAGE=sku)
+    available: int | None = None
+    reserved: int | None = None
+
+
+class ItemPage(BaseModel):
+    items: list[Item]
+    next: str | None = None
+
+
+class User(BaseModel):
+    id: str
+    firstName: str = ""
+    lastName: str = ""
+    address: str = ""
+    phoneNumber: str = ""
+    status: str = ""
+    role: str = ""
+    comments: str = ""
+
+
+class UserPage(BaseModel):
+    users: list[User]
+    next: str | None = None
+
+
+class Location(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    name: str
+    address: str = ""
+    postal_code: str = ""
+
+
+class LocationList(BaseModel):
+    locations: list[Location]
@@ -0,0 +1,21 @@
+"""
+Insert the sample users, locations, categories and items if they are missing.
+Safe to run repeatedly, existing documents are not touched or duplicated.
+
+    python -m app.seed
+
+The backend does the same on startup when SEED_ON_STARTUP=1.
+"""
+import asyncio
+
+from app.main import close_client, ensure_indexes, seed_fixtures
+
+
+async def seed():
+    await ensure_indexes()
+    await seed_fixtures()
+    await close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(seed())
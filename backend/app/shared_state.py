@@ -0,0 +1,163 @@
+import asyncio
+import os
+import pickle
+import struct
+import time
+
+from app.cache import CacheBackend, MemoryCache
+
+# State the gunicorn workers share: the response cache, a few counters and a
+# snapshot of every worker's metrics. One SharedStateServer runs next to the
+# gunicorn master (see gunicorn.conf.py) and listens on a unix socket that only
+# this user can open, the workers talk to it through SharedState.
+#
+# Frames are a 4 byte length followed by a pickled (op, args) tuple, the reply
+# is a pickled (ok, result) tuple.
+
+HEADER = struct.Struct("!I")
+
+
+async def read_frame(reader):
+    size = HEADER.unpack(await reader.readexactly(HEADER.size))[0]
+    return pickle.loads(await reader.readexactly(size))
+
+
+def write_frame(writer, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(HEADER.pack(len(data)) + data)
+
+
+class SharedStateServer:
+    def __init__(self, path, cache):
+        self.path = path
+        self.cache = cache
+        self.counters = {}
+        self.workers = {}  # worker id -> (published at, state)
+
+    async def get(self, key):
+        return await self.cache.get(key)
+
+    async def set(self, key, value, tags, generations=None):
+        await self.cache.set(key, value, tags, generations)
+
+    async def invalidate(self, *tags):
+        await self.cache.invalidate(*tags)
+
+    async def generations(self, tags):
+        return await self.cache.generations(tags)
+
+    async def size(self):
+        return await self.cache.size()
+
+    async def incr(self, name, delta=1):
+        self.counters[name] = self.counters.get(name, 0) + delta
+        return self.counters[name]
+
+    async def counter(self, name):
+        return self.counters.get(name, 0)
+
+    async def publish(self, worker, state):
+        self.workers[worker] = (time.monotonic(), state)
+
+    async def worker_states(self, max_age):
+        # workers that stopped publishing (exited, restarted) drop out
+        now = time.monotonic()
+        for worker in [w for w, (at, _) in self.workers.items() if now - at > max_age]:
+            del self.workers[worker]
+        return {worker: state for worker, (_, state) in self.workers.items()}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                op, args = await read_frame(reader)
+                try:
+                    reply = (True, await getattr(self, op)(*args))
+                except Exception as e:
+                    reply = (False, repr(e))
+                write_frame(writer, reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self.handle, self.path)
+        os.chmod(self.path, 0o600)
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(path):
+    """Entry point of the process gunicorn.conf.py starts"""
+    cache = MemoryCache(
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+        ttl=int(os.getenv("CACHE_TTL_SECONDS", "300")),
+    )
+    asyncio.run(SharedStateServer(path, cache).serve())
+
+
+class SharedState(CacheBackend):
+    """Client side, a small pool of socket connections per worker"""
+
+    def __init__(self, path, connections=8):
+        self.path = path
+        self.pool = asyncio.LifoQueue()
+        self.opened = 0
+        self.max_connections = connections
+
+    async def call(self, op, *args):
+        if self.pool.empty() and self.opened < self.max_connections:
+            self.opened += 1
+            try:
+                connection = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                self.opened -= 1
+                raise
+        else:
+            connection = await self.pool.get()
+        reader, writer = connection
+        try:
+            write_frame(writer, (op, args))
+            await writer.drain()
+            ok, result = await read_frame(reader)
+        except BaseException as e:
+            # the connection may be halfway through a frame, do not reuse it
+            writer.close()
+            self.opened -= 1
+            if isinstance(e, asyncio.IncompleteReadError):
+                raise ConnectionError(f"shared state server closed the connection during {op}") from e
+            raise
+        self.pool.put_nowait(connection)
+        if not ok:
+            raise RuntimeError(f"shared state {op} failed: {result}")
+        return result
+
+    async def get(self, key):
+        return await self.call("get", key)
+
+    async def set(self, key, value, tags, generations=None):
+        await self.call("set", key, value, tags, generations)
+
+    async def invalidate(self, *tags):
+        await self.call("invalidate", *tags)
+
+    async def generations(self, tags):
+        return await self.call("generations", tags)
+
+    async def size(self):
+        return await self.call("size")
+
+    async def incr(self, name, delta=1):
+        return await self.call("incr", name, delta)
+
+    async def counter(self, name):
+        return await self.call("counter", name)
+
+    async def publish(self, worker, state):
+        await self.call("publish", worker, state)
+
+    async def worker_states(self, max_age=60):
+        return await self.call("worker_states", max_age)
@@ -0,0 +1,113 @@
+import asyncio
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+def sku_event(old, new):
+    """Delta between two versions of a SKU document, None if nothing changed"""
+    doc = new or old
+    available = (new or {}).get("available", 0)
+    reserved = (new or {}).get("reserved", 0)
+    delta_available = available - (old or {}).get("available", 0)
+    delta_reserved = reserved - (old or {}).get("reserved", 0)
+    if not delta_available and not delta_reserved:
+        return None
+    return {
+        "location": doc.get("location"),
+        "category": doc.get("category"),
+        "name": doc.get("name"),
+        "available": available,
+        "reserved": reserved,
+        "delta_available": delta_available,
+        "delta_reserved": delta_reserved,
+    }
+
+
+class StockFeed:
+    """
+    Watches db.skus once and fans the count deltas out to every subscriber.
+    Uses a change stream, or polls the collection when Mongo runs standalone
+    (change streams need a replica set). Runs only while someone listens.
+    """
+
+    def __init__(self, get_collection, poll_seconds=2, queue_size=1000, retry_seconds=5):
+        self.get_collection = get_collection  # called when the watcher starts
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.snapshot = {}  # _id -> last seen SKU document
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()  # slow client, drop its oldest event
+            queue.put_nowait(event)
+
+    def apply(self, doc_id, new):
+        event = sku_event(self.snapshot.get(doc_id), new)
+        if new is None:
+            self.snapshot.pop(doc_id, None)
+        else:
+            self.snapshot[doc_id] = new
+        if event:
+            self.publish(event)
+
+    async def load_snapshot(self):
+        self.snapshot = {doc["_id"]: doc async for doc in self.get_collection().find({})}
+
+    async def run(self):
+        use_stream = True
+        while True:
+            try:
+                if use_stream:
+                    try:
+                        await self.watch()
+                    except OperationFailure:
+                        print("Change streams not available, polling db.skus for stock changes.")
+                        use_stream = False
+                else:
+                    await self.poll()
+            except PyMongoError as e:
+                # Mongo unreachable, a failover etc.: keep the subscribers and start over
+                print(f"Stock feed failed: {e!r}, retrying in {self.retry_seconds}s.")
+                await asyncio.sleep(self.retry_seconds)
+
+    async def watch(self):
+        async with await self.get_collection().watch(full_document="updateLookup") as stream:
+            # the stream is open, anything after this point is in it
+            await self.load_snapshot()
+            async for change in stream:
+                if change["operationType"] == "delete":
+                    self.apply(change["documentKey"]["_id"], None)
+                elif "fullDocument" in change:
+                    self.apply(change["documentKey"]["_id"], change["fullDocument"])
+
+    async def poll(self):
+        await self.load_snapshot()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            current = {doc["_id"]: doc async for doc in self.get_collection().find({})}
+            for doc_id in self.snapshot.keys() - current.keys():
+                self.apply(doc_id, None)
+            for doc_id, doc in current.items():
+                self.apply(doc_id, doc)
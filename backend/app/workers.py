@@ -0,0 +1,45 @@
+import os
+
+# Settings for running several worker processes (gunicorn.conf.py). With a
+# single uvicorn process they fall back to the single process behaviour.
+
+
+def worker_count():
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def mongo_pool_size():
+    """
+    maxPoolSize of this worker: MONGO_POOL_BUDGET is the total for all
+    workers together and split evenly, without it MONGO_MAX_POOL_SIZE applies
+    per process. The driver's monitoring connections come on top.
+    """
+    budget = os.getenv("MONGO_POOL_BUDGET")
+    if budget:
+        return max(1, int(budget) // worker_count())
+    return int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+
+
+leader_lock = None
+
+
+def acquire_leadership(path):
+    """
+    True for the one worker holding the lock file. The OS drops the lock when
+    that worker exits, the worker gunicorn starts in its place takes it over.
+    """
+    global leader_lock
+    if leader_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:  # Windows, no multi-worker mode there
+        return True
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    leader_lock = lock_file
+    return True
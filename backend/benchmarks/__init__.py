@@ -0,0 +1 @@
+# makes 'benchmarks' a Python package so scripts can import app
@@ -0,0 +1,70 @@
+"""
+Encode time per endpoint payload: the old path (jsonable_encoder + stdlib json)
+against the path the endpoint takes now. With a response model FastAPI
+validates the result, dumps it to JSON compatible data and FastJSONResponse
+encodes that with orjson. Cached endpoints like /locations skip the model, the
+cache encodes the result with orjson directly. No database needed.
+
+    python -m benchmarks.bench_encoding
+"""
+import json
+import os
+import time
+
+import orjson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.main import sample_locations, sample_users, user_to_dict
+from app.models import ItemPage, UserPage
+
+SIZE = int(os.getenv("BENCH_SIZE", "10000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20"))
+
+items = {
+    "items": [
+        {"id": str(ObjectId()), "name": "Decke", "category": "bedding", "status": "available", "location": "loc_west"}
+        for _ in range(SIZE)
+    ],
+    "next": None,
+}
+users = [user_to_dict({**sample_users[i % len(sample_users)], "_id": ObjectId()}) for i in range(SIZE)]
+locations = {"locations": [sample_locations[i % len(sample_locations)] for i in range(SIZE)]}
+
+# (name, payload, response model adapter, the endpoint's response_model_exclude_unset)
+PAYLOADS = [
+    ("GET /items", items, TypeAdapter(ItemPage), True),
+    ("GET /users", {"users": users, "next": None}, TypeAdapter(UserPage), False),
+    ("GET /locations", locations, None, False),
+]
+
+
+def response_model_path(adapter, payload, exclude_unset):
+    """What FastAPI's serialize_response + FastJSONResponse.render do"""
+    content = adapter.dump_python(adapter.validate_python(payload), mode="json", exclude_unset=exclude_unset)
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def timed(fn):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+if __name__ == "__main__":
+    print(f"{SIZE} documents per payload, median of {ROUNDS} rounds")
+    print(f"{'endpoint':<16}{'before':>11}{'now':>12}   path now")
+    for name, payload, adapter, exclude_unset in PAYLOADS:
+        before = timed(lambda: json.dumps(jsonable_encoder(payload)).encode())
+        if adapter is None:
+            now = timed(lambda: orjson.dumps(payload, default=str))
+            path = "orjson (response cache)"
+        else:
+            now = timed(lambda: response_model_path(adapter, payload, exclude_unset))
+            path = "validate + dump + orjson"
+        print(f"{name:<16}{before:>8.2f} ms{now:>9.2f} ms   {path}")
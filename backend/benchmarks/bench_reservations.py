@@ -0,0 +1,54 @@
+"""
+Hundreds of parallel reservers against one SKU: checks that no more than the
+stock is ever reserved and reports reservations/sec.
+
+    pip install httpx
+    python -m benchmarks.bench_reservations --url http://localhost:8000 --stock 500 --reservers 400 --quantity 2
+
+Uses its own location (loc_bench_<timestamp>) so real stock is not touched.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def main(url, stock, reservers, quantity):
+    sku = {"name": "Schlafsack", "category": "bedding", "location": f"loc_bench_{int(time.time())}"}
+    async with httpx.AsyncClient(base_url=url, timeout=60,
+                                 limits=httpx.Limits(max_connections=reservers)) as http:
+        res = await http.post("/items/bulk", json=[{**sku, "quantity": stock}])
+        res.raise_for_status()
+
+        async def reserve():
+            res = await http.post("/reservations", json={**sku, "quantity": quantity})
+            return "error" not in res.json()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(reserve() for _ in range(reservers)))
+        elapsed = time.perf_counter() - start
+
+        detail = (await http.get(f"/items/{sku['category']}/{sku['name']}")).json()
+        counts = detail["per_location"][sku["location"]]
+
+    granted = sum(results)
+    print(f"{reservers} reservers x {quantity} units against a stock of {stock}")
+    print(f"granted {granted} ({granted * quantity} units), refused {reservers - granted}")
+    print(f"{reservers / elapsed:.1f} reservation requests/sec")
+    print(f"counters after the run: {counts}")
+
+    assert granted * quantity <= stock, "oversold"
+    assert granted == min(reservers, stock // quantity), "stock left although reservers were refused"
+    assert counts["reserved"] == granted * quantity and counts["overall"] == stock, "counters out of sync"
+    print("OK: no oversell")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--reservers", type=int, default=400)
+    parser.add_argument("--quantity", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.stock, args.reservers, args.quantity))
@@ -0,0 +1,61 @@
+"""
+Fire N concurrent clients at a running backend and report requests/sec.
+
+    pip install httpx
+    python -m benchmarks.load_test --url http://localhost:8000 --clients 500 --requests 20
+
+To compare the blocking driver with the async one, run it once against a
+build of the commit before the async switch and once against the current one
+(same MONGO_URL, same data).
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+ENDPOINTS = [
+    "/items/by_location?location=loc_centrum",
+    "/items/bedding",
+    "/items/bedding/Bett",
+    "/items/hygiene/Seife",
+    "/locations",
+    "/users",
+]
+
+
+async def client_loop(http, requests, latencies, errors):
+    for i in range(requests):
+        path = ENDPOINTS[i % len(ENDPOINTS)]
+        start = time.perf_counter()
+        try:
+            res = await http.get(path)
+            res.raise_for_status()
+        except httpx.HTTPError:
+            errors.append(path)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def main(url, clients, requests):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(http, requests, latencies, errors) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{clients} clients x {requests} requests in {elapsed:.2f} s")
+    print(f"requests/sec: {len(latencies) / elapsed:.1f}   errors: {len(errors)}")
+    if latencies:
+        print(f"p50 {latencies[len(latencies) // 2]:.1f} ms   p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.clients, args.requests))
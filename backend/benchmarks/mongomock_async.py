@@ -0,0 +1,149 @@
+"""
+Minimal AsyncMongoClient stand-in on top of mongomock, so the benchmark suite
+can run without a mongod (pip install mongomock). All clients share one
+in-memory server. Numbers from it only compare code paths, not Mongo itself.
+
+Change streams are reported as unavailable, the stock feed falls back to polling.
+"""
+import mongomock
+from pymongo.errors import OperationFailure
+
+server = mongomock.MongoClient()
+
+cursor_chain = ("sort", "limit", "skip", "batch_size", "hint", "max_time_ms")
+
+
+def wrap_async(fn):
+    async def call(*args, **kwargs):
+        return fn(*args, **kwargs)
+    return call
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.iterator = None
+
+    def __getattr__(self, name):
+        attr = getattr(self.cursor, name)
+        if name in cursor_chain:
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        return attr
+
+    def __aiter__(self):
+        self.iterator = iter(self.cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+    async def explain(self):
+        raise OperationFailure("explain is not supported by mongomock")
+
+    async def close(self):
+        pass
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    @property
+    def name(self):
+        return self.collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return AsyncCursor(iter(list(self.collection.aggregate(*args, **kwargs))))
+
+    async def list_indexes(self):
+        return AsyncCursor(iter(list(self.collection.list_indexes())))
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        # replayed one by one, mongomock does not know the newer operation options
+        result = BulkResult()
+        for i, op in enumerate(requests):
+            kind = type(op).__name__
+            if kind in ("UpdateOne", "UpdateMany"):
+                update = self.collection.update_one if kind == "UpdateOne" else self.collection.update_many
+                res = update(op._filter, op._doc, upsert=op._upsert)
+                result.matched_count += res.matched_count
+                result.modified_count += res.modified_count
+                if res.upserted_id is not None:
+                    result.upserted_ids[i] = res.upserted_id
+            elif kind == "InsertOne":
+                self.collection.insert_one(op._doc)
+                result.inserted_count += 1
+            elif kind == "ReplaceOne":
+                self.collection.replace_one(op._filter, op._doc, upsert=op._upsert)
+            elif kind in ("DeleteOne", "DeleteMany"):
+                delete = self.collection.delete_one if kind == "DeleteOne" else self.collection.delete_many
+                result.deleted_count += delete(op._filter).deleted_count
+        return result
+
+    async def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", 40573)
+
+    def __getattr__(self, name):
+        return wrap_async(getattr(self.collection, name))
+
+
+class BulkResult:
+    def __init__(self):
+        self.matched_count = self.modified_count = self.inserted_count = self.deleted_count = 0
+        self.upserted_ids = {}
+
+    @property
+    def upserted_count(self):
+        return len(self.upserted_ids)
+
+
+class AsyncDatabase:
+    def __init__(self, database):
+        self.database = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.database[name])
+
+    async def create_collection(self, name, **options):
+        # time-series and TTL options are ignored, a plain collection does for the benchmarks
+        return AsyncCollection(self.database.create_collection(name))
+
+    async def command(self, name, *args, **kwargs):
+        if name == "ping":
+            return {"ok": 1.0}
+        return self.database.command(name, *args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.database, name)
+        if isinstance(attr, mongomock.Collection):
+            return AsyncCollection(attr)
+        return wrap_async(attr) if callable(attr) else attr
+
+
+class AsyncMongoClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getitem__(self, name):
+        return AsyncDatabase(server[name])
+
+    def get_database(self, name):
+        return AsyncDatabase(server[name])
+
+    async def drop_database(self, name):
+        server.drop_database(name)
+
+    async def close(self):
+        pass
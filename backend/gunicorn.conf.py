@@ -0,0 +1,56 @@
+"""
+Multi-worker mode, one uvicorn worker per core:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+WEB_CONCURRENCY sets the number of workers (default: CPU count), MONGO_POOL_BUDGET
+the Mongo connections of all workers together. The master starts the shared
+state server (app/shared_state.py) before forking, the workers find it
+through SHARED_STATE_SOCKET.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.shared_state import run_server
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+# every worker imports the app after the fork, so no Mongo client or
+# asyncio state is ever inherited from the master
+preload_app = False
+graceful_timeout = 10
+
+# app/workers.py splits the pool budget by this
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+shared_state_process = None
+
+
+def on_starting(server):
+    global shared_state_process
+    path = os.path.join(tempfile.gettempdir(), f"aoz-shared-{os.getpid()}.sock")
+    os.environ["SHARED_STATE_SOCKET"] = path
+    shared_state_process = multiprocessing.Process(target=run_server, args=(path,), daemon=True)
+    shared_state_process.start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.05)
+    server.log.info("Shared state server listening on %s", path)
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s forked, it creates its own Mongo client on first use", worker.pid)
+
+
+def on_exit(server):
+    if shared_state_process is not None:
+        shared_state_process.terminate()
+        shared_state_process.join(5)
+    path = os.environ.get("SHARED_STATE_SOCKET")
+    for leftover in (path, f"{path}.leader"):
+        if path and os.path.exists(leftover):
+            os.unlink(leftover)
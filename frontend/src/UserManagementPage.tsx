@@ -33,12 +33,21 @@ const statusColors: Record<"Aktiv" | "Deaktiviert", string> = {
 
 const UserManagementPage: React.FC = () => {
   const [users, setUsers] = useState<User[]>(initialUsers);
+  const [next, setNext] = useState<string | null>(null);
 
-  useEffect(() => {
-    fetch(API_URL)
+  // the backend returns one page at a time, "next" is the cursor for the following page
+  const loadUsers = (after: string | null) => {
+    const url = after ? `${API_URL}?after=${encodeURIComponent(after)}` : API_URL;
+    return fetch(url)
       .then(res => res.json())
-      .then(data => setUsers(data))
-      .catch(() => console.warn("Backend nicht erreichbar, nutze initialUsers"));
+      .then(data => {
+        setUsers(prev => after ? [...prev, ...data.users] : data.users);
+        setNext(data.next);
+      });
+  };
+
+  useEffect(() => {
+    loadUsers(null).catch(() => console.warn("Backend nicht erreichbar, nutze initialUsers"));
   }, []);
 
   const handleChange = (id: number | string, field: keyof User, value: any) => {
@@ -142,6 +151,11 @@ const UserManagementPage: React.FC = () => {
           </tbody>
         </table>
       </div>
+      {next && (
+        <button style={{ ...buttonStyle, marginTop: "16px" }} onClick={() => loadUsers(next)}>
+          Weitere laden
+        </button>
+      )}
     </div>
   );
 };